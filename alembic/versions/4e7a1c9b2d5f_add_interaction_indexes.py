@@ -0,0 +1,26 @@
+"""Add interaction indexes
+
+Revision ID: 4e7a1c9b2d5f
+Revises: c3ba7d5037ea
+Create Date: 2026-10-18 10:12:41.208316
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '4e7a1c9b2d5f'
+down_revision = 'c3ba7d5037ea'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_interactions_session_id', 'interactions', ['session_id'])
+    op.create_index(
+        'ix_interactions_user_id_timestamp', 'interactions', ['user_id', 'timestamp'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_interactions_user_id_timestamp', table_name='interactions')
+    op.drop_index('ix_interactions_session_id', table_name='interactions')
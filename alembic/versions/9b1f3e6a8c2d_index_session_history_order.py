@@ -0,0 +1,28 @@
+"""Index session history order
+
+Revision ID: 9b1f3e6a8c2d
+Revises: 4e7a1c9b2d5f
+Create Date: 2026-10-18 11:03:27.540192
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9b1f3e6a8c2d'
+down_revision = '4e7a1c9b2d5f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_interactions_session_id_timestamp',
+        'interactions',
+        ['session_id', 'timestamp', 'id'])
+    op.drop_index('ix_interactions_session_id', table_name='interactions')
+
+
+def downgrade() -> None:
+    op.create_index('ix_interactions_session_id', 'interactions', ['session_id'])
+    op.drop_index('ix_interactions_session_id_timestamp', table_name='interactions')
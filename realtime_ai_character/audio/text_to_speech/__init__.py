@@ -2,6 +2,7 @@ import os
 from typing import Optional
 
 from realtime_ai_character.audio.text_to_speech.base import TextToSpeech
+from realtime_ai_character.audio.text_to_speech.cache import get_cached_text_to_speech
 from realtime_ai_character.logger import get_logger
 
 logger = get_logger(__name__)
@@ -45,4 +46,4 @@ def get_text_to_speech(tts: Optional[str] = None) -> TextToSpeech:
     else:
         raise NotImplementedError(f"Unknown text to speech engine: {tts}")
     logger.info(f"Initialized TTS instance: {instance.__class__.__name__}")
-    return instance
+    return get_cached_text_to_speech(instance)
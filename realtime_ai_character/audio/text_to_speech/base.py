@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
 from asyncio import Event
+from typing import Optional
 
 from fastapi import WebSocket
 
@@ -7,6 +8,9 @@ from realtime_ai_character.utils import timed
 
 
 class TextToSpeech(ABC):
+    # segmentation policy for this engine, see segmenter.get_segmenter; None uses the default
+    segmentation_policy: Optional[str] = None
+
     @abstractmethod
     @timed
     async def stream(
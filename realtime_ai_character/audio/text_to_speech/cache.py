@@ -0,0 +1,444 @@
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+from cachetools import LRUCache
+
+from realtime_ai_character.audio.text_to_speech.base import TextToSpeech
+from realtime_ai_character.logger import get_logger
+from realtime_ai_character.utils import get_timer
+
+
+logger = get_logger(__name__)
+
+timer = get_timer()
+
+TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "true") == "true"
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "./tts_cache")
+TTS_CACHE_MEMORY_BYTES = int(os.getenv("TTS_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+TTS_CACHE_DISK_BYTES = int(os.getenv("TTS_CACHE_DISK_BYTES", str(512 * 1024 * 1024)))
+# disk entries not played for this many seconds are deleted
+TTS_CACHE_MAX_AGE = float(os.getenv("TTS_CACHE_MAX_AGE", str(30 * 24 * 3600)))
+# only short phrases (greetings, "Great job!") are worth caching
+TTS_CACHE_MAX_TEXT_LENGTH = int(os.getenv("TTS_CACHE_MAX_TEXT_LENGTH", "200"))
+
+Frame = tuple[str, object]
+
+
+class FrameRecorder:
+    """Records the frames of a TTS engine and plays them to any number of websockets.
+
+    Listeners receive the frames as they are recorded, so callers that join a clip that
+    is still being synthesized don't wait for its end. Twilio media and mark messages are
+    recorded without their stream sid so that a clip can be played into any call.
+    """
+
+    def __init__(self):
+        self.frames: list[Frame] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.task: Optional[asyncio.Task] = None
+        self._listeners = 0
+        self._changed = asyncio.Event()
+
+    def _record(self, frame: Frame):
+        self.frames.append(frame)
+        self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def send_bytes(self, data: bytes):
+        self._record(("bytes", bytes(data)))
+
+    async def send_json(self, data):
+        event = data.get("event") if isinstance(data, dict) else None
+        if event == "media":
+            self._record(("media", data["media"]["payload"]))
+        elif event == "mark":
+            self._record(("mark", data["mark"]["name"]))
+        else:
+            self._record(("json", data))
+
+    async def send_text(self, data: str):
+        self._record(("text", data))
+
+    def _leave(self):
+        self._listeners -= 1
+        if self._listeners == 0 and not self.done and self.task is not None:
+            # nobody is listening anymore, an incomplete clip is not worth finishing
+            self.task.cancel()
+
+    async def wait(self) -> list[Frame]:
+        """All frames of the clip, once it is complete."""
+        self._listeners += 1
+        try:
+            while not self.done:
+                await self._changed.wait()
+        finally:
+            self._leave()
+        if self.error is not None:
+            raise self.error
+        return self.frames
+
+    async def play(self, websocket, tts_event: asyncio.Event, sid: str = ""):
+        """Send the frames to `websocket` as they are recorded, until `tts_event` is set."""
+        self._listeners += 1
+        try:
+            sent = 0
+            while True:
+                while sent < len(self.frames):
+                    if tts_event.is_set():
+                        # stop streaming audio
+                        return
+                    await _send_frame(websocket, *self.frames[sent], sid=sid)
+                    sent += 1
+                if self.done:
+                    break
+                await self._changed.wait()
+        finally:
+            self._leave()
+        if self.error is not None:
+            raise self.error
+
+
+async def _send_frame(websocket, kind: str, data, sid: str = ""):
+    if kind == "bytes":
+        await websocket.send_bytes(data)
+    elif kind == "media":
+        await websocket.send_json({"event": "media", "streamSid": sid, "media": {"payload": data}})
+    elif kind == "mark":
+        await websocket.send_json({"event": "mark", "streamSid": sid, "mark": {"name": data}})
+    elif kind == "json":
+        await websocket.send_json(data)
+    else:
+        await websocket.send_text(data)
+
+
+async def replay(frames: list[Frame], websocket, tts_event: asyncio.Event, sid: str = ""):
+    for kind, data in frames:
+        if tts_event.is_set():
+            # stop streaming audio
+            break
+        await _send_frame(websocket, kind, data, sid=sid)
+
+
+def _frames_size(frames: list[Frame]) -> int:
+    return sum(len(data) if isinstance(data, (bytes, str)) else 64 for _, data in frames)
+
+
+def _encode_frames(frames: list[Frame]) -> str:
+    return json.dumps(
+        [
+            [kind, base64.b64encode(data).decode() if kind == "bytes" else data]
+            for kind, data in frames
+        ]
+    )
+
+
+def _decode_frames(content: str) -> list[Frame]:
+    return [
+        (kind, base64.b64decode(data) if kind == "bytes" else data)
+        for kind, data in json.loads(content)
+    ]
+
+
+class TTSCache:
+    """Two-tier (memory LRU + disk) store of synthesized clips with single-flight.
+
+    Only clips whose synthesis completed are stored. The disk tier drops entries unused
+    for TTS_CACHE_MAX_AGE and the least recently used ones beyond TTS_CACHE_DISK_BYTES.
+    """
+
+    def __init__(
+        self,
+        directory: str = TTS_CACHE_DIR,
+        memory_bytes: int = TTS_CACHE_MEMORY_BYTES,
+        disk_bytes: int = TTS_CACHE_DISK_BYTES,
+        max_age: float = TTS_CACHE_MAX_AGE,
+        max_text_length: int = TTS_CACHE_MAX_TEXT_LENGTH,
+    ):
+        self.directory = Path(directory)
+        self.disk_bytes = disk_bytes
+        self.max_age = max_age
+        self.max_text_length = max_text_length
+        self._memory: LRUCache = LRUCache(maxsize=memory_bytes, getsizeof=_frames_size)
+        self._inflight: dict[tuple, FrameRecorder] = {}
+        # size of the disk tier, known after the first write
+        self._disk_usage: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "inflight": len(self._inflight),
+            "memory_bytes": int(self._memory.currsize),
+            "disk_bytes": self._disk_usage or 0,
+        }
+
+    def cacheable(self, text: str) -> bool:
+        return 0 < len(text) <= self.max_text_length
+
+    def _path(self, key: tuple) -> Path:
+        digest = hashlib.sha256(json.dumps(key).encode()).hexdigest()
+        return self.directory / digest[:2] / f"{digest}.json"
+
+    def _read(self, path: Path) -> Optional[list[Frame]]:
+        try:
+            if time.time() - path.stat().st_mtime > self.max_age:
+                path.unlink(missing_ok=True)
+                return None
+            frames = _decode_frames(path.read_text())
+            # the modification time orders entries for eviction
+            os.utime(path)
+            return frames
+        except FileNotFoundError:
+            return None
+        except (ValueError, OSError) as e:
+            logger.warning(f"Discarding unreadable TTS cache entry {path}: {e}")
+            return None
+
+    def _write(self, path: Path, frames: list[Frame]) -> int:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        content = _encode_frames(frames)
+        tmp_path.write_text(content)
+        os.replace(tmp_path, path)
+        return len(content)
+
+    def _prune(self) -> int:
+        """Delete expired entries, then the least recently used ones until the disk tier
+        is below 90% of its size limit, so that not every write prunes again.
+
+        Returns the size of the remaining entries.
+        """
+        now = time.time()
+        entries = []
+        for path in self.directory.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime > self.max_age:
+                path.unlink(missing_ok=True)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.disk_bytes * 0.9:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+        return total
+
+    async def get(self, key: tuple) -> Optional[list[Frame]]:
+        frames = self._memory.get(key)
+        if frames is None:
+            frames = await asyncio.to_thread(self._read, self._path(key))
+            if frames is not None:
+                self._remember(key, frames)
+        if frames is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return frames
+
+    def _remember(self, key: tuple, frames: list[Frame]):
+        try:
+            self._memory[key] = frames
+        except ValueError:
+            # larger than the whole memory tier
+            pass
+
+    async def _persist(self, key: tuple, frames: list[Frame]):
+        try:
+            size = await asyncio.to_thread(self._write, self._path(key), frames)
+            if self._disk_usage is None or self._disk_usage + size > self.disk_bytes:
+                self._disk_usage = await asyncio.to_thread(self._prune)
+            else:
+                self._disk_usage += size
+        except OSError as e:
+            logger.warning(f"Failed to persist TTS cache entry: {e}")
+
+    async def put(self, key: tuple, frames: list[Frame]):
+        self._remember(key, frames)
+        await self._persist(key, frames)
+
+    def join(self, key: tuple, synthesize) -> FrameRecorder:
+        """The clip being synthesized for `key`, started with `synthesize` if there is none.
+
+        `synthesize(recorder)` records the clip into the given FrameRecorder. The clip is
+        cached if it returns normally with at least one frame; an error is raised to the
+        listeners of the clip instead.
+        """
+        clip = self._inflight.get(key)
+        if clip is None:
+            clip = FrameRecorder()
+            self._inflight[key] = clip
+            clip.task = asyncio.create_task(self._synthesize(key, clip, synthesize))
+        return clip
+
+    async def _synthesize(self, key: tuple, clip: FrameRecorder, synthesize):
+        error = None
+        try:
+            await synthesize(clip)
+        except (asyncio.CancelledError, Exception) as e:
+            # cancelled when every listener left
+            error = e
+        complete = error is None and bool(clip.frames)
+        if complete:
+            self._remember(key, clip.frames)
+        del self._inflight[key]
+        clip.finish(error)
+        if complete:
+            await self._persist(key, clip.frames)
+
+
+class CachedTextToSpeech(TextToSpeech):
+    """Serves repeated phrases of a TTS engine from the synthesized-audio cache."""
+
+    def __init__(self, engine: TextToSpeech, cache: TTSCache):
+        self.engine = engine
+        self.cache = cache
+
+    @property
+    def segmentation_policy(self):
+        return self.engine.segmentation_policy
+
+    def _key(self, text: str, voice_id: str, language: str, output_format: str) -> tuple:
+        return (self.engine.__class__.__name__, voice_id, language, output_format, text)
+
+    def _stream_key(
+        self, text: str, voice_id: str, language: str, platform: str, first_sentence: bool
+    ) -> tuple:
+        output_format = "ulaw_8000" if platform == "twilio" else "default"
+        # engines may synthesize first sentences differently, e.g. ElevenLabs optimizes
+        # them for latency
+        if first_sentence:
+            output_format += "+first_sentence"
+        return self._key(text, voice_id, language, output_format)
+
+    def _join_stream(self, key: tuple, text, voice_id, first_sentence, language, **kwargs):
+        async def synthesize(recorder: FrameRecorder):
+            # the clip is shared, it stops when all its listeners left rather than on the
+            # tts_event of one of them
+            await self.engine.stream(
+                text=text,
+                websocket=recorder,
+                tts_event=asyncio.Event(),
+                voice_id=voice_id,
+                first_sentence=first_sentence,
+                language=language,
+                **kwargs,
+            )
+
+        return self.cache.join(key, synthesize)
+
+    async def stream(
+        self,
+        text,
+        websocket,
+        tts_event: asyncio.Event,
+        voice_id="",
+        first_sentence=False,
+        language="en-US",
+        *args,
+        **kwargs,
+    ):
+        if not self.cache.cacheable(text):
+            return await self.engine.stream(
+                text=text,
+                websocket=websocket,
+                tts_event=tts_event,
+                voice_id=voice_id,
+                first_sentence=first_sentence,
+                language=language,
+                **kwargs,
+            )
+
+        key = self._stream_key(
+            text, voice_id, language, kwargs.get("platform", ""), first_sentence
+        )
+        sid = kwargs.get("sid", "")
+        frames = await self.cache.get(key)
+        if frames is None:
+            clip = self._join_stream(key, text, voice_id, first_sentence, language, **kwargs)
+            return await clip.play(websocket, tts_event, sid=sid)
+        timer.start("TTS Cache Replay")
+        await replay(frames, websocket, tts_event, sid=sid)
+        timer.log("TTS Cache Replay")
+
+    async def generate_audio(self, text, voice_id="", language="en-US"):
+        if not self.cache.cacheable(text):
+            return await self.engine.generate_audio(text, voice_id=voice_id, language=language)
+
+        async def synthesize(recorder: FrameRecorder):
+            audio = await self.engine.generate_audio(text, voice_id=voice_id, language=language)
+            if audio:
+                await recorder.send_bytes(audio)
+
+        key = self._key(text, voice_id, language, "file")
+        frames = await self.cache.get(key)
+        if frames is None:
+            frames = await self.cache.join(key, synthesize).wait()
+        return frames[0][1] if frames else None
+
+    async def prewarm(
+        self, texts: dict[str, str], voice_id: str = "", platform: str = "", concurrency: int = 4
+    ):
+        """Synthesize `texts` ({language: text}) into the cache ahead of the first session."""
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def warm(language: str, text: str):
+            key = self._stream_key(text, voice_id, language, platform, True)
+            async with semaphore:
+                try:
+                    if await self.cache.get(key) is None:
+                        await self._join_stream(
+                            key, text, voice_id, True, language, platform=platform, priority=0
+                        ).wait()
+                except Exception as e:
+                    logger.warning(f"Failed to prewarm TTS cache for {language}: {e}")
+
+        await asyncio.gather(*(warm(language, text) for language, text in texts.items()))
+        logger.info(
+            f"Prewarmed TTS cache for {self.engine.__class__.__name__} voice '{voice_id}' "
+            f"({len(texts)} phrases)"
+        )
+
+
+_tts_cache: Optional[TTSCache] = None
+_cached_engines: dict[type, CachedTextToSpeech] = {}
+
+
+def get_tts_cache() -> TTSCache:
+    global _tts_cache
+    if _tts_cache is None:
+        _tts_cache = TTSCache()
+    return _tts_cache
+
+
+def tts_cache_stats() -> dict[str, int]:
+    """Stats of the TTS cache, without creating it."""
+    return _tts_cache.stats() if _tts_cache is not None else {}
+
+
+def get_cached_text_to_speech(engine: TextToSpeech) -> TextToSpeech:
+    if not TTS_CACHE_ENABLED:
+        return engine
+    if engine.__class__ not in _cached_engines:
+        _cached_engines[engine.__class__] = CachedTextToSpeech(engine, get_tts_cache())
+    return _cached_engines[engine.__class__]
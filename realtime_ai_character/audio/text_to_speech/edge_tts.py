@@ -1,9 +1,13 @@
 import asyncio
+import base64
 import os
+import time
+from typing import Optional
 
-from edge_tts import Communicate, VoicesManager
+from edge_tts import Communicate, list_voices
 
 from realtime_ai_character.audio.text_to_speech.base import TextToSpeech
+from realtime_ai_character.audio.text_to_speech.utils import Mp3FrameAligner, UlawTranscoder
 from realtime_ai_character.logger import get_logger
 from realtime_ai_character.utils import Singleton, timed
 
@@ -11,12 +15,44 @@ from realtime_ai_character.utils import Singleton, timed
 logger = get_logger(__name__)
 
 EDGE_TTS_DEFAULT_VOICE = os.getenv("EDGE_TTS_DEFAULT_VOICE", "en-US-ChristopherNeural")
+# the voice catalog rarely changes, refresh it in the background once a day
+EDGE_TTS_VOICES_REFRESH_INTERVAL = int(os.getenv("EDGE_TTS_VOICES_REFRESH_INTERVAL", "86400"))
+# a failed load is retried sooner
+EDGE_TTS_VOICES_RETRY_INTERVAL = int(os.getenv("EDGE_TTS_VOICES_RETRY_INTERVAL", "60"))
 
 
 class EdgeTTS(Singleton, TextToSpeech):
     def __init__(self):
         super().__init__()
         logger.info("Initializing [EdgeTTS] voices...")
+        self.voices: dict[str, dict] = {}  # voice catalog indexed by ShortName
+        self._voices_refresh_at = 0.0  # time.monotonic() after which the catalog is reloaded
+        self._voices_task: Optional[asyncio.Task] = None
+
+    async def _load_voices(self):
+        try:
+            voices = await list_voices()
+            if not voices:
+                raise ValueError("empty catalog")
+        except Exception as e:
+            logger.warning(f"Failed to load EdgeTTS voice catalog: {e}")
+            self._voices_refresh_at = time.monotonic() + EDGE_TTS_VOICES_RETRY_INTERVAL
+            return
+        self.voices = {voice["ShortName"]: voice for voice in voices}
+        self._voices_refresh_at = time.monotonic() + EDGE_TTS_VOICES_REFRESH_INTERVAL
+        logger.info(f"Loaded {len(self.voices)} EdgeTTS voices")
+
+    async def _get_voice_name(self, voice_id: str) -> str:
+        if self._voices_task is None or (
+            self._voices_task.done() and time.monotonic() >= self._voices_refresh_at
+        ):
+            self._voices_task = asyncio.create_task(self._load_voices())
+        if not self.voices:
+            # only the very first request waits for the catalog
+            await asyncio.shield(self._voices_task)
+        voice = self.voices.get(voice_id) or self.voices.get(EDGE_TTS_DEFAULT_VOICE)
+        # Communicate also accepts short names, e.g. when the catalog is unreachable
+        return voice["Name"] if voice else voice_id or EDGE_TTS_DEFAULT_VOICE
 
     @timed
     async def stream(
@@ -27,29 +63,51 @@ class EdgeTTS(Singleton, TextToSpeech):
         voice_id="",
         first_sentence=False,
         language="en-US",
+        sid="",
+        platform="",
         *args,
         **kwargs
     ) -> None:
-        voices = await VoicesManager.create()
-        try:
-            voice = voices.find(ShortName=voice_id)[0]
-        except IndexError:
-            voice = voices.find(ShortName=EDGE_TTS_DEFAULT_VOICE)[0]
-        communicate = Communicate(text, voice["Name"], rate="+20%")
-        messages = []
+        communicate = Communicate(text, await self._get_voice_name(voice_id), rate="+20%")
+        # The stream packets are not aligned to MP3 frames and break on playback when
+        # sent as is, so forward them re-cut on frame boundaries (or as mu-law for twilio).
+        converter = UlawTranscoder() if platform == "twilio" else Mp3FrameAligner()
         async for message in communicate.stream():
+            if tts_event.is_set():
+                # stop streaming audio
+                return
             if message["type"] == "audio":
-                # Choose to accmulate the audio data because
-                # the stream packets are broken when playback.
-                messages.extend(message["data"])
-        await websocket.send_bytes(bytes(messages))
+                await self._send_audio(websocket, converter.feed(message["data"]), sid, platform)
+        await self._send_audio(websocket, converter.flush(), sid, platform)
+
+    async def _send_audio(self, websocket, audio_bytes: bytes, sid: str, platform: str):
+        if not audio_bytes:
+            return
+        if platform != "twilio":
+            await websocket.send_bytes(audio_bytes)
+            return
+        media_response = {
+            "event": "media",
+            "streamSid": sid,
+            "media": {
+                "payload": base64.b64encode(audio_bytes).decode(),
+            },
+        }
+        # "done" marker is sent to twilio to track if the audio has been completed.
+        await websocket.send_json(media_response)
+        mark = {
+            "event": "mark",
+            "streamSid": sid,
+            "mark": {
+                "name": "done",
+            },
+        }
+        await websocket.send_json(mark)
 
     async def generate_audio(self, text, voice_id="", language="en-US") -> bytes:
-        voices = await VoicesManager.create()
-        voice = voices.find(ShortName=voice_id)[0]
-        communicate = Communicate(text, voice["Name"], rate="+20%")
-        messages = []
+        communicate = Communicate(text, await self._get_voice_name(voice_id), rate="+20%")
+        audio = bytearray()
         async for message in communicate.stream():
             if message["type"] == "audio":
-                messages.extend(message["data"])
-        return bytes(messages)
+                audio += message["data"]
+        return bytes(audio)
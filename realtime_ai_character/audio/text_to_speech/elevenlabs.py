@@ -3,9 +3,8 @@ import base64
 import os
 import types
 
-import httpx
-
 from realtime_ai_character.audio.text_to_speech.base import TextToSpeech
+from realtime_ai_character.audio.text_to_speech.http_client import get_http_client
 from realtime_ai_character.logger import get_logger
 from realtime_ai_character.utils import Singleton, timed
 
@@ -68,12 +67,16 @@ class ElevenLabs(Singleton, TextToSpeech):
         url += "?output_format=" + ("ulaw_8000" if platform == "twilio" else "mp3_44100_128")
         if first_sentence:
             url += "&optimize_streaming_latency=4"
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=data, headers=headers)
+        client = get_http_client("elevenlabs")
+        async with client.stream("POST", url, json=data, headers=headers) as response:
             if response.status_code != 200:
-                logger.error(f"ElevenLabs returns response {response.status_code}")
+                # the body is an error message, not audio
+                await response.aread()
+                logger.error(
+                    f"ElevenLabs returns response {response.status_code}: {response.text}"
+                )
+            response.raise_for_status()
             async for chunk in response.aiter_bytes():
-                await asyncio.sleep(0.1)
                 if tts_event.is_set():
                     # stop streaming audio
                     break
@@ -112,9 +115,10 @@ class ElevenLabs(Singleton, TextToSpeech):
         }
         # Change to non-streaming endpoint
         url = config.url.format(voice_id=voice_id).replace("/stream", "")
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=data, headers=headers)
-            if response.status_code != 200:
-                logger.error(f"ElevenLabs returns response {response.status_code}")
-            # Get audio/mpeg from the response and return it
-            return response.content
+        client = get_http_client("elevenlabs")
+        response = await client.post(url, json=data, headers=headers)
+        if response.status_code != 200:
+            logger.error(f"ElevenLabs returns response {response.status_code}: {response.text}")
+        response.raise_for_status()
+        # Get audio/mpeg from the response and return it
+        return response.content
@@ -5,10 +5,10 @@ import os
 import types
 
 import google.auth.transport.requests
-import httpx
 from google.oauth2 import service_account
 
 from realtime_ai_character.audio.text_to_speech.base import TextToSpeech
+from realtime_ai_character.audio.text_to_speech.http_client import get_http_client
 from realtime_ai_character.logger import get_logger
 from realtime_ai_character.utils import Singleton, timed
 
@@ -63,9 +63,9 @@ class GoogleCloudTTS(Singleton, TextToSpeech):
         **kwargs,
     ) -> None:
         if self.credentials.expired:
-            # Request an access token
+            # Request an access token without blocking the event loop
             auth_req = google.auth.transport.requests.Request()
-            self.credentials.refresh(auth_req)
+            await asyncio.to_thread(self.credentials.refresh, auth_req)
 
         # Set the Authorization header with the access token
         headers = {
@@ -90,40 +90,40 @@ class GoogleCloudTTS(Singleton, TextToSpeech):
             data["audioConfig"]["sampleRateHertz"] = 8000
 
         url = config.url
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=data, headers=headers)
-            response.raise_for_status()
-
-            # Google Cloud TTS API does not support streaming, we send the whole content at once
-            content = json.loads(response.content)
-            audio_b64 = content["audioContent"]  # base64 encoded string
-            if platform != "twilio":
-                audio_content = base64.b64decode(audio_b64)
-                await websocket.send_bytes(audio_content)
-                return
-
-            # audio_b64 includes WAV header. After base64 decode, the legnth is 58 Bytes for
-            # the header. After encoding the WAV header, the length is 224. So we trunck the
-            # first 224 bytes of the response received from google text to speech as twilio
-            # is not expecting audio bytes to include WAV header:
-            # https://www.twilio.com/docs/voice/twiml/stream#message-media-to-twilio
-            media_response = {
-                "event": "media",
-                "streamSid": sid,
-                "media": {
-                    "payload": audio_b64[224:],
-                },
-            }
-            # "done" marker is sent to twilio to track if the audio has been completed.
-            await websocket.send_json(media_response)
-            mark = {
-                "event": "mark",
-                "streamSid": sid,
-                "mark": {
-                    "name": "done",
-                },
-            }
-            await websocket.send_json(mark)
+        client = get_http_client("google")
+        response = await client.post(url, json=data, headers=headers)
+        response.raise_for_status()
+
+        # Google Cloud TTS API does not support streaming, we send the whole content at once
+        content = json.loads(response.content)
+        audio_b64 = content["audioContent"]  # base64 encoded string
+        if platform != "twilio":
+            audio_content = base64.b64decode(audio_b64)
+            await websocket.send_bytes(audio_content)
+            return
+
+        # audio_b64 includes WAV header. After base64 decode, the legnth is 58 Bytes for
+        # the header. After encoding the WAV header, the length is 224. So we trunck the
+        # first 224 bytes of the response received from google text to speech as twilio
+        # is not expecting audio bytes to include WAV header:
+        # https://www.twilio.com/docs/voice/twiml/stream#message-media-to-twilio
+        media_response = {
+            "event": "media",
+            "streamSid": sid,
+            "media": {
+                "payload": audio_b64[224:],
+            },
+        }
+        # "done" marker is sent to twilio to track if the audio has been completed.
+        await websocket.send_json(media_response)
+        mark = {
+            "event": "mark",
+            "streamSid": sid,
+            "mark": {
+                "name": "done",
+            },
+        }
+        await websocket.send_json(mark)
 
     async def generate_audio(self, text, voice_id="", language="en-US") -> bytes:
         headers = config.headers
@@ -142,12 +142,12 @@ class GoogleCloudTTS(Singleton, TextToSpeech):
             data["voice"]["name"] = voice_id
             if voice_id == "en-US-Studio-O":
                 data["voice"]["ssmlGender"] = "FEMALE"
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=data, headers=headers)
-            if response.status_code != 200:
-                raise Exception(f"Google Cloud TTS returns response {response.status_code}")
-            else:
-                audio_content = response.content
-                # Decode the base64-encoded audio content
-                audio_content = base64.b64decode(audio_content)
-                return audio_content
+        client = get_http_client("google")
+        response = await client.post(url, json=data, headers=headers)
+        if response.status_code != 200:
+            raise Exception(f"Google Cloud TTS returns response {response.status_code}")
+        else:
+            audio_content = response.content
+            # Decode the base64-encoded audio content
+            audio_content = base64.b64decode(audio_content)
+            return audio_content
@@ -0,0 +1,58 @@
+import importlib.util
+import os
+from typing import Optional
+
+import httpx
+
+from realtime_ai_character.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+# HTTP/2 needs the optional `h2` package; fall back to HTTP/1.1 keep-alive without it.
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+TTS_HTTP_MAX_CONNECTIONS = int(os.getenv("TTS_HTTP_MAX_CONNECTIONS", "20"))
+
+# per-provider connection limits and timeouts, in seconds
+PROVIDER_CONFIGS = {
+    "elevenlabs": {"max_connections": TTS_HTTP_MAX_CONNECTIONS, "connect": 5.0, "read": 30.0},
+    "google": {"max_connections": TTS_HTTP_MAX_CONNECTIONS, "connect": 5.0, "read": 30.0},
+    "openai": {"max_connections": TTS_HTTP_MAX_CONNECTIONS, "connect": 5.0, "read": 60.0},
+    # self-hosted XTTS synthesizes on GPU and can queue requests by priority
+    "xtts": {"max_connections": TTS_HTTP_MAX_CONNECTIONS, "connect": 5.0, "read": 120.0},
+}
+DEFAULT_PROVIDER_CONFIG = {"max_connections": 10, "connect": 5.0, "read": 30.0}
+
+_clients: dict[str, httpx.AsyncClient] = {}
+
+
+def get_http_client(provider: str) -> httpx.AsyncClient:
+    """Return the long-lived, pooled client shared by all sessions of a TTS provider.
+
+    Reusing the client keeps TCP/TLS connections alive between sentences instead of
+    paying a new handshake for every request.
+    """
+    client = _clients.get(provider)
+    if client is None or client.is_closed:
+        config = PROVIDER_CONFIGS.get(provider, DEFAULT_PROVIDER_CONFIG)
+        client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            limits=httpx.Limits(
+                max_connections=config["max_connections"],
+                max_keepalive_connections=config["max_connections"],
+                keepalive_expiry=60.0,
+            ),
+            timeout=httpx.Timeout(config["read"], connect=config["connect"]),
+        )
+        _clients[provider] = client
+        logger.info(f"Created pooled HTTP client for [{provider}] (http2={HTTP2_AVAILABLE})")
+    return client
+
+
+async def close_http_clients(provider: Optional[str] = None):
+    providers = [provider] if provider else list(_clients)
+    for name in providers:
+        client = _clients.pop(name, None)
+        if client is not None:
+            await client.aclose()
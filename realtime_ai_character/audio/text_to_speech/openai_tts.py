@@ -1,16 +1,27 @@
 import asyncio
+import base64
 import os
+from time import perf_counter
 from typing import Optional
 
 import httpx
 from fastapi import WebSocket
 
 from realtime_ai_character.audio.text_to_speech.base import TextToSpeech
+from realtime_ai_character.audio.text_to_speech.http_client import get_http_client
+from realtime_ai_character.audio.text_to_speech.utils import Mp3FrameAligner, UlawTranscoder
 from realtime_ai_character.logger import get_logger
-from realtime_ai_character.utils import Singleton, timed
+from realtime_ai_character.utils import get_timer, Singleton, timed
 
 logger = get_logger(__name__)
 
+timer = get_timer()
+
+# stream audio chunks as they arrive; set to "false" to send each sentence as one clip
+OPENAI_TTS_STREAMING = os.getenv("OPENAI_TTS_STREAMING", "true") == "true"
+
+OPENAI_TTS_URL = "https://api.openai.com/v1/audio/speech"
+
 class OpenAITTS(Singleton, TextToSpeech):
     def __init__(self):
         super().__init__()
@@ -18,7 +29,6 @@ class OpenAITTS(Singleton, TextToSpeech):
         self.api_key = os.getenv("OPENAI_API_KEY")
         if not self.api_key:
             logger.error("OpenAI API key is not set!")
-        self.client = httpx.AsyncClient(timeout=None)
         self.default_voice_id = "shimmer"
         self.default_language = "en"
         self.model = "tts-1"
@@ -46,58 +56,61 @@ class OpenAITTS(Singleton, TextToSpeech):
             logger.info("TTS event triggered.")
 
         try:
-            # Prepare the request payload
+            # Prepare the request payload. Twilio expects 8 kHz mu-law, which OpenAI can't
+            # produce, so request raw pcm and transcode it while streaming.
             payload = {
                 "model": self.model,
                 "voice": voice_id,
                 "input": text,  # Changed 'text' back to 'input'
+                "response_format": "pcm" if platform == "twilio" else "mp3",
             }
+            if platform == "twilio":
+                converter = UlawTranscoder(input_format="pcm", sample_rate=24000)
+            else:
+                # Chunks are re-aligned on MP3 frames so the client can decode each message
+                converter = Mp3FrameAligner()
 
             # Send TTS request to OpenAI
             logger.info("Sending TTS request to OpenAI...")
 
-            response = await self.client.post(
-                "https://api.openai.com/v1/audio/speech",  # Correct endpoint
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                },
-                json=payload  # Send data as JSON
-            )
-
-            # Log response status and headers
-            logger.debug(f"Received response status: {response.status_code}")
-            logger.debug(f"Response headers: {response.headers}")
-
-            response.raise_for_status()
-
-            # Handle the response (assuming the API returns the audio data directly)
-            audio_data = response.content
-
-            if platform != "twilio":
-                # Send binary audio data directly
-                await websocket.send_bytes(audio_data)
-            else:
-                # Handle Twilio-specific requirements
-                import base64
-                audio_b64 = base64.b64encode(audio_data).decode()
-                media_response = {
-                    "event": "media",
-                    "streamSid": sid,
-                    "media": {
-                        "payload": audio_b64,
-                    },
-                }
-                await websocket.send_json(media_response)
-                # Send done marker
-                mark = {
-                    "event": "mark",
-                    "streamSid": sid,
-                    "mark": {
-                        "name": "done",
-                    },
-                }
-                await websocket.send_json(mark)
+            if not OPENAI_TTS_STREAMING:
+                response = await get_http_client("openai").post(
+                    OPENAI_TTS_URL, headers=self._headers(), json=payload
+                )
+                response.raise_for_status()
+                audio_data = converter.feed(response.content) + converter.flush()
+                await self._send_audio(websocket, audio_data, platform, sid)
+                await self._send_done(websocket, platform, sid)
+                logger.info("Audio data sent successfully.")
+                return
+
+            # Forward audio as it is synthesized instead of waiting for the whole clip.
+            start_time = perf_counter()
+            first_byte = True
+            async with get_http_client("openai").stream(
+                "POST", OPENAI_TTS_URL, headers=self._headers(), json=payload
+            ) as response:
+                logger.debug(f"Received response status: {response.status_code}")
+                if response.status_code != 200:
+                    await response.aread()
+                response.raise_for_status()
+
+                async for chunk in response.aiter_bytes():
+                    if first_byte:
+                        timer.record("OpenAI TTS First Byte", perf_counter() - start_time)
+                        first_byte = False
+                    if tts_event.is_set():
+                        # stop streaming audio
+                        logger.info("TTS event triggered, stop streaming audio.")
+                        return
+                    audio_data = converter.feed(chunk)
+                    if audio_data:
+                        await self._send_audio(websocket, audio_data, platform, sid)
+
+            audio_data = converter.flush()
+            if audio_data and not tts_event.is_set():
+                await self._send_audio(websocket, audio_data, platform, sid)
+            await self._send_done(websocket, platform, sid)
 
             logger.info("Audio data sent successfully.")
         except httpx.HTTPStatusError as e:
@@ -107,6 +120,40 @@ class OpenAITTS(Singleton, TextToSpeech):
             logger.error(f"Unexpected error in OpenAI TTS: {e}")
             raise
 
+    def _headers(self) -> dict:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+    async def _send_audio(self, websocket: WebSocket, audio_data: bytes, platform: str, sid: str):
+        if platform != "twilio":
+            # Send binary audio data directly
+            await websocket.send_bytes(audio_data)
+        else:
+            # Handle Twilio-specific requirements
+            audio_b64 = base64.b64encode(audio_data).decode()
+            media_response = {
+                "event": "media",
+                "streamSid": sid,
+                "media": {
+                    "payload": audio_b64,
+                },
+            }
+            await websocket.send_json(media_response)
+
+    async def _send_done(self, websocket: WebSocket, platform: str, sid: str):
+        if platform == "twilio":
+            # Send done marker
+            mark = {
+                "event": "mark",
+                "streamSid": sid,
+                "mark": {
+                    "name": "done",
+                },
+            }
+            await websocket.send_json(mark)
+
     async def generate_audio(
         self,
         text: str,
@@ -129,13 +176,8 @@ class OpenAITTS(Singleton, TextToSpeech):
             # Send request to OpenAI for audio generation
             logger.info("Sending request to OpenAI for audio generation...")
 
-            response = await self.client.post(
-                "https://api.openai.com/v1/audio/speech",  # Correct endpoint
-                headers={
-                    "Authorization": f"Bearer {self.api_key}",
-                    "Content-Type": "application/json"
-                },
-                json=payload  # Send data as JSON
+            response = await get_http_client("openai").post(
+                OPENAI_TTS_URL, headers=self._headers(), json=payload
             )
 
             # Log response status and headers
@@ -0,0 +1,97 @@
+import asyncio
+import base64
+import os
+import weakref
+
+from realtime_ai_character.audio.text_to_speech.utils import parse_mp3_frame_header
+
+
+# seconds of audio that may be sent ahead of what the client has played
+TTS_PLAYOUT_LEAD = float(os.getenv("TTS_PLAYOUT_LEAD", "0.5"))
+
+ULAW_SAMPLE_RATE = 8000
+
+
+def mp3_duration(data: bytes) -> float:
+    """Estimate the playback duration of an MP3 chunk from the first frame header in it.
+
+    TTS providers stream constant-bitrate MP3, so the bitrate of any frame is enough,
+    and the chunk does not need to start on a frame boundary.
+    """
+    offset = data.find(b"\xff")
+    while offset != -1 and offset + 4 <= len(data):
+        frame = parse_mp3_frame_header(data[offset : offset + 4])
+        if frame is not None:
+            length, duration = frame
+            return len(data) * duration / length
+        offset = data.find(b"\xff", offset + 1)
+    return 0.0
+
+
+class PlayoutClock:
+    """Tracks how much audio a connection has been sent against real playback time.
+
+    `pace` lets audio through immediately until `lead` seconds are buffered on the
+    client, then holds each chunk back until playback catches up. The first sentence
+    therefore lands at once, the client never starves, and on barge-in no more than
+    `lead` seconds of audio are left to stop.
+    """
+
+    def __init__(self, lead: float = TTS_PLAYOUT_LEAD):
+        self.lead = lead
+        self._playout_end = 0.0  # loop time at which the audio sent so far ends
+
+    def buffered(self) -> float:
+        return max(self._playout_end - asyncio.get_running_loop().time(), 0.0)
+
+    def reset(self):
+        """Forget buffered audio, e.g. after the client dropped it on barge-in."""
+        self._playout_end = 0.0
+
+    async def pace(self, duration: float):
+        # always yield once so chunks are not sent to the client in a batch
+        await asyncio.sleep(max(self.buffered() - self.lead, 0.0))
+        now = asyncio.get_running_loop().time()
+        self._playout_end = max(self._playout_end, now) + duration
+
+
+class PacedWebSocket:
+    """Websocket wrapper that paces TTS audio frames with the connection's PlayoutClock."""
+
+    def __init__(self, websocket, clock: PlayoutClock):
+        self.websocket = websocket
+        self.clock = clock
+
+    async def send_bytes(self, data: bytes):
+        await self.clock.pace(mp3_duration(data))
+        await self.websocket.send_bytes(data)
+
+    async def send_json(self, data):
+        if isinstance(data, dict) and data.get("event") == "media":
+            # twilio media payloads are base64 encoded 8 kHz mu-law, one byte per sample
+            payload = data["media"]["payload"]
+            await self.clock.pace(len(base64.b64decode(payload)) / ULAW_SAMPLE_RATE)
+        await self.websocket.send_json(data)
+
+    async def send_text(self, data: str):
+        await self.websocket.send_text(data)
+
+    def __getattr__(self, name):
+        return getattr(self.websocket, name)
+
+
+_clocks: "weakref.WeakKeyDictionary[object, PlayoutClock]" = weakref.WeakKeyDictionary()
+
+
+def get_playout_clock(websocket) -> PlayoutClock:
+    if isinstance(websocket, PacedWebSocket):
+        return websocket.clock
+    if websocket not in _clocks:
+        _clocks[websocket] = PlayoutClock()
+    return _clocks[websocket]
+
+
+def get_paced_websocket(websocket) -> PacedWebSocket:
+    if isinstance(websocket, PacedWebSocket):
+        return websocket
+    return PacedWebSocket(websocket, get_playout_clock(websocket))
@@ -0,0 +1,155 @@
+import asyncio
+import os
+from typing import Optional
+
+from fastapi import WebSocket
+
+from realtime_ai_character.audio.text_to_speech.base import TextToSpeech
+from realtime_ai_character.audio.text_to_speech.pacing import get_paced_websocket
+from realtime_ai_character.logger import get_logger
+from realtime_ai_character.utils import get_timer
+
+
+logger = get_logger(__name__)
+
+timer = get_timer()
+
+# number of sentences that may be synthesized ahead of the one being played
+TTS_PIPELINE_LOOKAHEAD = int(os.getenv("TTS_PIPELINE_LOOKAHEAD", "2"))
+
+
+class SentenceBuffer:
+    """Stands in for the websocket while a sentence is synthesized ahead of playback.
+
+    Frames sent by the TTS engine are queued here and forwarded to the real websocket
+    by the pipeline once every earlier sentence has been delivered.
+    """
+
+    def __init__(self):
+        self.frames: asyncio.Queue = asyncio.Queue()
+
+    async def send_bytes(self, data: bytes):
+        await self.frames.put(("bytes", data))
+
+    async def send_json(self, data):
+        await self.frames.put(("json", data))
+
+    async def send_text(self, data: str):
+        await self.frames.put(("text", data))
+
+    def close(self):
+        self.frames.put_nowait(None)
+
+
+class TTSPipeline:
+    """Synthesizes the sentences of one reply concurrently and plays them in order.
+
+    Sentences are queued with `put` as soon as the LLM finishes them. Up to `lookahead`
+    sentences are synthesized while an earlier one is still streaming to the client, so
+    there is no gap between sentences. Audio always reaches the websocket in order.
+    """
+
+    def __init__(
+        self,
+        text_to_speech: TextToSpeech,
+        websocket: WebSocket,
+        tts_event: asyncio.Event,
+        voice_id: str = "",
+        language: str = "en-US",
+        sid: str = "",
+        platform: str = "",
+        lookahead: int = TTS_PIPELINE_LOOKAHEAD,
+    ):
+        self.text_to_speech = text_to_speech
+        # audio is paced against the client's playback as it is delivered
+        self.websocket = get_paced_websocket(websocket)
+        self.tts_event = tts_event
+        self.voice_id = voice_id
+        self.language = language
+        self.sid = sid
+        self.platform = platform
+        # one slot for the sentence being played, the rest for look-ahead synthesis
+        self._slots = asyncio.Semaphore(max(lookahead, 0) + 1)
+        self._sentences: asyncio.Queue[Optional[SentenceBuffer]] = asyncio.Queue()
+        self._synthesis_tasks: set[asyncio.Task] = set()
+        self._delivery_task: Optional[asyncio.Task] = None
+
+    def put(self, text: str, first_sentence: bool = False, priority: int = 100):
+        if self._delivery_task is None:
+            self._start()
+        buffer = SentenceBuffer()
+        self._sentences.put_nowait(buffer)
+        task = asyncio.create_task(self._synthesize(text, buffer, first_sentence, priority))
+        self._synthesis_tasks.add(task)
+        task.add_done_callback(self._synthesis_tasks.discard)
+
+    async def join(self):
+        """Wait until every queued sentence has been delivered."""
+        if self._delivery_task is None:
+            return
+        self._sentences.put_nowait(None)
+        await self._delivery_task
+
+    def cancel(self):
+        for task in list(self._synthesis_tasks):
+            task.cancel()
+        if self._delivery_task is not None and not self._delivery_task.done():
+            self._delivery_task.cancel()
+
+    def _start(self):
+        self._delivery_task = asyncio.create_task(self._deliver())
+        # The pipeline lives as long as the reply that feeds it: when the LLM task is
+        # cancelled (e.g. user barge-in), pending synthesis is cancelled with it.
+        owner = asyncio.current_task()
+        if owner is not None:
+            owner.add_done_callback(lambda _: self.cancel())
+
+    async def _synthesize(
+        self, text: str, buffer: SentenceBuffer, first_sentence: bool, priority: int
+    ):
+        try:
+            await self._slots.acquire()
+            await self.text_to_speech.stream(
+                text=text,
+                websocket=buffer,
+                tts_event=self.tts_event,
+                voice_id=self.voice_id,
+                first_sentence=first_sentence,
+                language=self.language,
+                sid=self.sid,
+                platform=self.platform,
+                priority=priority,
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to synthesize sentence '{text[:30]}...': {e}")
+        finally:
+            buffer.close()
+
+    async def _deliver(self):
+        sentence_idx = 0
+        while True:
+            buffer = await self._sentences.get()
+            if buffer is None:
+                return
+            try:
+                while True:
+                    frame = await buffer.frames.get()
+                    if frame is None:
+                        break
+                    if self.tts_event.is_set():
+                        # stop streaming audio, but keep draining to release the slot
+                        continue
+                    kind, data = frame
+                    if kind == "bytes":
+                        await self.websocket.send_bytes(data)
+                    elif kind == "json":
+                        await self.websocket.send_json(data)
+                    else:
+                        await self.websocket.send_text(data)
+            finally:
+                self._slots.release()
+            if sentence_idx == 0:
+                timer.log("TTS First Sentence")
+            sentence_idx += 1
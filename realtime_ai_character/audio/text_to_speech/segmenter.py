@@ -0,0 +1,300 @@
+import os
+import re
+from functools import cache
+from typing import Optional
+
+import emoji
+
+from realtime_ai_character.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+# "sentence" sends every sentence as it is, "adaptive" shapes chunks for latency
+TTS_SEGMENTATION_POLICY = os.getenv("TTS_SEGMENTATION_POLICY", "adaptive")
+# the first chunk may be cut at a clause after this many words ...
+TTS_FIRST_CHUNK_MIN_WORDS = int(os.getenv("TTS_FIRST_CHUNK_MIN_WORDS", "4"))
+# ... and is cut at a word boundary after this many words
+TTS_FIRST_CHUNK_MAX_WORDS = int(os.getenv("TTS_FIRST_CHUNK_MAX_WORDS", "12"))
+# shorter sentences are merged with the next one, longer chunks are split
+TTS_CHUNK_MIN_CHARS = int(os.getenv("TTS_CHUNK_MIN_CHARS", "40"))
+TTS_CHUNK_MAX_CHARS = int(os.getenv("TTS_CHUNK_MAX_CHARS", "250"))
+
+# a sentence ends after CJK punctuation or a newline, or at a space after . ? !
+_BOUNDARY = re.compile(r"[.?!] |[。？！\n\r\t]")
+_LATIN_TERMINATORS = frozenset(".?!")
+_CLAUSE = re.compile(r"[,;:\u2013\u2014] |[，；：、]")
+# a CJK character counts as a word, as these scripts do not separate words by spaces
+_CJK = r"\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af"
+_WORD = re.compile(rf"[{_CJK}]|[^\s{_CJK}]+")
+
+_INVISIBLE = re.compile(
+    r"[\u200B\u200C\u200D\u200E\u200F\uFEFF\u00AD\u2060\uFFFC\uFFFD]"  # Format characters
+    r"|[\uFE00-\uFE0F]"  # Variation selectors
+    r"|[\uE000-\uF8FF]"  # Private use area
+    r"|[\uFFF0-\uFFFF]"  # Specials
+)
+
+
+def _trie_pattern(words) -> str:
+    """Regex matching any of `words`, factored as a trie so matching does not try every
+    word at every position."""
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def to_pattern(node: dict) -> str:
+        optional = "" in node
+        branches = [re.escape(char) + to_pattern(child) for char, child in node.items() if char]
+        if not branches:
+            return ""
+        pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if optional:
+            # the longest emoji wins, as in emoji.replace_emoji
+            pattern = "(?:" + pattern + ")?"
+        return pattern
+
+    return to_pattern(trie)
+
+
+@cache
+def emoji_pattern() -> re.Pattern:
+    return re.compile(_trie_pattern(emoji.EMOJI_DATA))
+
+
+@cache
+def _emoji_candidate() -> re.Pattern:
+    # Every emoji has a non-ASCII character. A handful of coarse code point ranges
+    # covering them is cheap to search, so most text skips the full pattern.
+    code_points = sorted({ord(c) for word in emoji.EMOJI_DATA for c in word if not c.isascii()})
+    ranges = [[code_points[0], code_points[0]]]
+    for code_point in code_points[1:]:
+        if code_point - ranges[-1][1] <= 256:
+            ranges[-1][1] = code_point
+        else:
+            ranges.append([code_point, code_point])
+    return re.compile(
+        "[" + "".join(f"{re.escape(chr(low))}-{re.escape(chr(high))}" for low, high in ranges) + "]"
+    )
+
+
+def remove_emoji(text: str) -> str:
+    """Same as `emoji.replace_emoji(text, "")`, but only tries the emoji pattern where an
+    emoji can start."""
+    pattern = emoji_pattern()
+    parts = []
+    end = 0
+    for candidate in _emoji_candidate().finditer(text):
+        position = candidate.start()
+        if position < end:
+            continue
+        # keycap emojis start with an ASCII character, e.g. "1\ufe0f\u20e3"
+        match = (position > end and pattern.match(text, position - 1)) or pattern.match(
+            text, position
+        )
+        if match and match.end() > position:
+            parts.append(text[end : match.start()])
+            end = match.end()
+    if not parts:
+        return text
+    parts.append(text[end:])
+    return "".join(parts)
+
+
+def normalize(text: str) -> str:
+    """Remove emojis and invisible characters that TTS engines read out or choke on."""
+    return _INVISIBLE.sub("", remove_emoji(text))
+
+
+class SentenceSegmenter:
+    """Cuts a stream of LLM tokens into normalized sentences for TTS.
+
+    Tokens are scanned once with a precompiled boundary pattern; a sentence is only
+    joined and normalized when it is complete. Boundaries split across tokens (". "
+    arriving as "." and " ") are detected too.
+    """
+
+    def __init__(self):
+        self._parts: list[str] = []
+        self._last_char = ""
+
+    def feed(self, token: str) -> list[str]:
+        """Add a token and return the sentences it completes."""
+        if not token:
+            return []
+        sentences = []
+        start = 0
+        if self._last_char in _LATIN_TERMINATORS and token[0] == " ":
+            start = 1
+            self._emit(" ", sentences)
+        for match in _BOUNDARY.finditer(token, start):
+            self._emit(token[start : match.end()], sentences)
+            start = match.end()
+        if start < len(token):
+            self._parts.append(token[start:])
+        self._last_char = token[-1]
+        return sentences
+
+    def flush(self) -> list[str]:
+        """Return the trailing text as a final sentence, if any."""
+        sentences: list[str] = []
+        self._emit("", sentences)
+        self._last_char = ""
+        return sentences
+
+    def _emit(self, tail: str, sentences: list[str]):
+        self._parts.append(tail)
+        sentence = normalize("".join(self._parts)).strip()
+        # blank lines and emoji-only "sentences" are dropped
+        if sentence:
+            sentences.append(sentence)
+        self._parts.clear()
+
+
+class AdaptiveSegmenter(SentenceSegmenter):
+    """Shapes sentences into TTS chunks that trade first-audio latency for fewer requests.
+
+    The first chunk is cut early, at the first clause boundary after `first_chunk_min_words`
+    words or at a word boundary after `first_chunk_max_words`. Later sentences shorter than
+    `min_chars` are merged with the next one, and chunks longer than `max_chars` are split
+    at a clause or word boundary.
+    """
+
+    def __init__(
+        self,
+        first_chunk_min_words: int = TTS_FIRST_CHUNK_MIN_WORDS,
+        first_chunk_max_words: int = TTS_FIRST_CHUNK_MAX_WORDS,
+        min_chars: int = TTS_CHUNK_MIN_CHARS,
+        max_chars: int = TTS_CHUNK_MAX_CHARS,
+    ):
+        super().__init__()
+        self.first_chunk_min_words = first_chunk_min_words
+        self.first_chunk_max_words = first_chunk_max_words
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self._chunk_count = 0
+        self._held = ""  # short sentences waiting to be merged with the next one
+
+    def feed(self, token: str) -> list[str]:
+        chunks = self._shape(super().feed(token))
+        if not chunks and self._chunk_count == 0:
+            chunks = self._cut_first_chunk()
+        self._chunk_count += len(chunks)
+        return chunks
+
+    def flush(self) -> list[str]:
+        chunks = self._shape(super().flush())
+        if self._held:
+            chunks += self._split(self._held)
+            self._held = ""
+        self._chunk_count = 0
+        return chunks
+
+    def _cut_first_chunk(self) -> list[str]:
+        pending = "".join(self._parts)
+        cut = 0
+        for match in _CLAUSE.finditer(pending):
+            if len(_WORD.findall(pending, 0, match.start())) >= self.first_chunk_min_words:
+                cut = match.end()
+                break
+        else:
+            words = list(_WORD.finditer(pending))
+            # the last word may still be growing, so only cut before it
+            if len(words) > self.first_chunk_max_words:
+                cut = words[self.first_chunk_max_words].start()
+        chunk = normalize(pending[:cut]).strip() if cut else ""
+        if not chunk:
+            return []
+        self._parts = [pending[cut:]]
+        return [chunk]
+
+    def _shape(self, sentences: list[str]) -> list[str]:
+        chunks = []
+        for sentence in sentences:
+            if self._held:
+                separator = "" if self._held[-1] in "。？！" else " "
+                sentence = self._held + separator + sentence
+                self._held = ""
+            if self._chunk_count + len(chunks) > 0 and len(sentence) < self.min_chars:
+                self._held = sentence
+            else:
+                chunks += self._split(sentence)
+        return chunks
+
+    def _split(self, text: str) -> list[str]:
+        chunks = []
+        while len(text) > self.max_chars:
+            head = text[: self.max_chars]
+            clauses = list(_CLAUSE.finditer(head))
+            cut = clauses[-1].end() if clauses else head.rfind(" ") + 1 or self.max_chars
+            chunks.append(text[:cut].strip())
+            text = text[cut:].strip()
+        if text:
+            chunks.append(text)
+        return chunks
+
+
+SEGMENTATION_POLICIES = {
+    "sentence": SentenceSegmenter,
+    "adaptive": AdaptiveSegmenter,
+}
+
+
+def get_segmenter(policy: Optional[str] = None) -> SentenceSegmenter:
+    """Create the segmenter of a policy name, falling back to TTS_SEGMENTATION_POLICY."""
+    policy = policy or TTS_SEGMENTATION_POLICY
+    if policy not in SEGMENTATION_POLICIES:
+        logger.warning(f"Unknown TTS segmentation policy '{policy}', using 'sentence'")
+        policy = "sentence"
+    return SEGMENTATION_POLICIES[policy]()
+
+
+if __name__ == "__main__":
+    import time
+
+    text = (
+        "Hello there! 😀 I'm glad you asked. Let me think about it\u200b for a moment... "
+        "Well, the answer is not simple; it depends on many things.\n"
+        "你好！今天天气很好。你想聊什么？ 👍🏽 Okay? Sure!\n"
+    ) * 200
+    # roughly what LLMs stream: a few characters per token
+    tokens = [text[i : i + 4] for i in range(0, len(text), 4)]
+
+    def legacy(tokens):
+        sentences, current = [], ""
+        for token in tokens:
+            token = emoji.replace_emoji(token, "")
+            token = re.sub(_INVISIBLE.pattern, "", token)
+            for char in token:
+                cut = (char == " " and current != "" and current[-1] in ".?!") or (
+                    char in "。？！\n\r\t"
+                )
+                current += char
+                if cut and current.strip():
+                    sentences.append(current.strip())
+                    current = ""
+        return sentences
+
+    def segmented(tokens, segmenter_class=SentenceSegmenter):
+        segmenter = segmenter_class()
+        sentences = []
+        for token in tokens:
+            sentences += segmenter.feed(token)
+        return sentences + segmenter.flush()
+
+    normalize("😀")  # compile the patterns up front, as a long-running server would
+    for name, run in (
+        ("legacy", legacy),
+        ("segmenter", segmented),
+        ("adaptive", lambda tokens: segmented(tokens, AdaptiveSegmenter)),
+    ):
+        start = time.perf_counter()
+        sentences = run(tokens)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name:>10}: {elapsed / len(tokens) * 1e6:6.2f} us/token, "
+            f"{len(tokens) / elapsed:10,.0f} tokens/s, {len(sentences)} chunks"
+        )
@@ -1,24 +1,229 @@
-import io
+import math
+from functools import cache
+from typing import Optional
 
+import numpy as np
+from scipy.signal import lfilter
 
-def MP3ToUlaw(src: bytes) -> bytes:
-    import torch
-    import torchaudio
 
-    waveform, sample_rate = torchaudio.load(io.BytesIO(src), normalize=True)  # type: ignore
-    waveform = torchaudio.functional.resample(waveform, sample_rate, 8000)
-    waveform = torchaudio.functional.highpass_biquad(waveform, sample_rate=8000, cutoff_freq=500)
-    waveform = torchaudio.functional.lowpass_biquad(waveform, sample_rate=8000, cutoff_freq=3500)
+# MPEG audio bitrates in kbps, indexed by [MPEG-1][layer][bitrate index]
+_MP3_BITRATES = {
+    True: {
+        1: [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+        2: [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+        3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    },
+    False: {
+        1: [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+        2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+        3: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    },
+}
+# sample rates in Hz, indexed by version bits
+_MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
 
-    # ulaw encoding
-    ulaw_encoding = torchaudio.transforms.MuLawEncoding(quantization_channels=256)
-    ulaw_waveform = ulaw_encoding(waveform).to(torch.uint8)
 
-    buffer = io.BytesIO()
-    writer = torchaudio.io.StreamWriter(dst=buffer, format="mulaw")
-    writer.add_audio_stream(sample_rate=8000, num_channels=1, format="u8")
+def parse_mp3_frame_header(header: bytes) -> Optional[tuple[int, float]]:
+    """Return (frame length in bytes, duration in seconds) of an MPEG audio frame header.
 
-    with writer.open():
-        writer.write_audio_chunk(0, torch.transpose(ulaw_waveform, 0, 1))
+    Returns None if `header` (at least 4 bytes) is not a valid frame header.
+    """
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = (header[1] >> 3) & 0x03
+    layer = 4 - ((header[1] >> 1) & 0x03)
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x03
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    mpeg1 = version == 3
+    bitrate = _MP3_BITRATES[mpeg1][layer][bitrate_index] * 1000
+    sample_rate = _MP3_SAMPLE_RATES[version][sample_rate_index]
+    padding = (header[2] >> 1) & 0x01
+    if layer == 1:
+        return (12 * bitrate // sample_rate + padding) * 4, 384 / sample_rate
+    samples = 1152 if layer == 2 or mpeg1 else 576
+    return samples // 8 * bitrate // sample_rate + padding, samples / sample_rate
 
-    return buffer.getvalue()
+
+class Mp3FrameAligner:
+    """Re-chunks an MP3 byte stream on frame boundaries.
+
+    Network chunks split MP3 frames at arbitrary offsets, but clients decode every
+    websocket message on its own. `feed` buffers partial frames and returns only whole
+    frames, at least `min_bytes` at a time so each message is worth decoding.
+    """
+
+    def __init__(self, min_bytes: int = 4096):
+        self.min_bytes = min_bytes
+        self.duration = 0.0  # seconds of audio returned so far
+        self._buffer = bytearray()
+        self._aligned = 0  # bytes at the head of the buffer that are whole frames
+        self._aligned_duration = 0.0
+
+    def _scan(self):
+        buffer = self._buffer
+        while self._aligned + 4 <= len(buffer):
+            offset = self._aligned
+            if buffer[offset : offset + 3] == b"ID3":
+                # ID3v2 tag: 10 byte header followed by a syncsafe size
+                if offset + 10 > len(buffer):
+                    return
+                size = 10 + (
+                    (buffer[offset + 6] << 21)
+                    | (buffer[offset + 7] << 14)
+                    | (buffer[offset + 8] << 7)
+                    | buffer[offset + 9]
+                )
+                if offset + size > len(buffer):
+                    return
+                self._aligned += size
+                continue
+            frame = parse_mp3_frame_header(bytes(buffer[offset : offset + 4]))
+            if frame is None:
+                # not at a frame boundary; drop bytes until the next sync word
+                next_sync = buffer.find(b"\xff", offset + 1)
+                del buffer[offset : next_sync if next_sync != -1 else len(buffer)]
+                continue
+            length, duration = frame
+            if offset + length > len(buffer):
+                return
+            self._aligned += length
+            self._aligned_duration += duration
+
+    def _take(self) -> bytes:
+        data = bytes(self._buffer[: self._aligned])
+        del self._buffer[: self._aligned]
+        self.duration += self._aligned_duration
+        self._aligned = 0
+        self._aligned_duration = 0.0
+        return data
+
+    def feed(self, chunk: bytes) -> bytes:
+        self._buffer += chunk
+        self._scan()
+        if self._aligned < self.min_bytes:
+            return b""
+        return self._take()
+
+    def flush(self) -> bytes:
+        """Return every remaining whole frame, dropping a trailing partial frame."""
+        self._scan()
+        data = self._take()
+        self._buffer.clear()
+        return data
+
+
+@cache
+def ulaw_table() -> np.ndarray:
+    """G.711 mu-law code of every 16-bit PCM sample, indexed by the sample as uint16.
+
+    Same encoding as `audioop.lin2ulaw`, precomputed so a whole chunk is encoded with a
+    single table lookup.
+    """
+    pcm = np.arange(-32768, 32768, dtype=np.int32) >> 2  # 14-bit range
+    mask = np.where(pcm < 0, 0x7F, 0xFF)
+    magnitude = np.minimum(np.abs(pcm), 8159) + 33
+    segment = np.floor(np.log2(magnitude)).astype(np.int32) - 5
+    codes = np.where(
+        segment >= 8,
+        0x7F ^ mask,
+        ((np.minimum(segment, 7) << 4) | ((magnitude >> (np.minimum(segment, 7) + 1)) & 0x0F))
+        ^ mask,
+    )
+    # reorder so that a uint16 view of the samples can index the table directly
+    return np.roll(codes.astype(np.uint8), -32768)
+
+
+def lin2ulaw(samples: np.ndarray) -> bytes:
+    return ulaw_table()[samples.astype(np.int16).view(np.uint16)].tobytes()
+
+
+class _Biquad:
+    """RBJ-cookbook biquad filter that keeps its state across calls."""
+
+    def __init__(self, kind: str, sample_rate: int, cutoff_freq: float, Q: float = 0.707):
+        w0 = 2 * math.pi * cutoff_freq / sample_rate
+        alpha = math.sin(w0) / 2 / Q
+        cos_w0 = math.cos(w0)
+        if kind == "highpass":
+            b = [(1 + cos_w0) / 2, -1 - cos_w0, (1 + cos_w0) / 2]
+        else:
+            b = [(1 - cos_w0) / 2, 1 - cos_w0, (1 - cos_w0) / 2]
+        a0 = 1 + alpha
+        self.b = np.array(b) / a0
+        self.a = np.array([1.0, -2 * cos_w0 / a0, (1 - alpha) / a0])
+        self.zi = np.zeros(2)
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        y, self.zi = lfilter(self.b, self.a, x, zi=self.zi)
+        return y
+
+
+class UlawTranscoder:
+    """Incrementally converts a TTS audio stream into 8 kHz mu-law for Twilio.
+
+    One instance is used per stream. The MP3 decoder, resampler and band-pass filters
+    keep their state between chunks, so chunks may split MP3 frames anywhere and the
+    filters do not click at chunk boundaries. `input_format` is "mp3" or "pcm"
+    (16-bit little-endian mono at `sample_rate`).
+    """
+
+    OUTPUT_SAMPLE_RATE = 8000
+
+    def __init__(self, input_format: str = "mp3", sample_rate: int = 24000):
+        import av
+
+        self.input_format = input_format
+        self.sample_rate = sample_rate
+        self._decoder = av.CodecContext.create("mp3", "r") if input_format == "mp3" else None
+        self._resampler = av.AudioResampler(
+            format="s16", layout="mono", rate=self.OUTPUT_SAMPLE_RATE
+        )
+        self._pcm_remainder = b""
+        self._highpass = _Biquad("highpass", self.OUTPUT_SAMPLE_RATE, cutoff_freq=500)
+        self._lowpass = _Biquad("lowpass", self.OUTPUT_SAMPLE_RATE, cutoff_freq=3500)
+
+    def _decode(self, chunk: Optional[bytes]) -> list:
+        import av
+
+        if self._decoder is not None:
+            frames = []
+            for packet in self._decoder.parse(chunk):
+                frames += self._decoder.decode(packet)
+            if chunk is None:
+                frames += self._decoder.decode(None)
+            return frames
+        if chunk is None:
+            return []
+        data = self._pcm_remainder + chunk
+        usable = len(data) - len(data) % 2
+        self._pcm_remainder = data[usable:]
+        if not usable:
+            return []
+        samples = np.frombuffer(data[:usable], dtype=np.int16).reshape(1, -1)
+        frame = av.AudioFrame.from_ndarray(samples, format="s16", layout="mono")
+        frame.sample_rate = self.sample_rate
+        return [frame]
+
+    def _encode(self, frames: list) -> bytes:
+        if not frames:
+            return b""
+        samples = np.concatenate([frame.to_ndarray().reshape(-1) for frame in frames])
+        if not len(samples):
+            return b""
+        waveform = self._lowpass(self._highpass(samples.astype(np.float64)))
+        return lin2ulaw(np.clip(np.round(waveform), -32768, 32767))
+
+    def feed(self, chunk: bytes) -> bytes:
+        frames = []
+        for frame in self._decode(chunk):
+            frames += self._resampler.resample(frame)
+        return self._encode(frames)
+
+    def flush(self) -> bytes:
+        frames = []
+        for frame in self._decode(None):
+            frames += self._resampler.resample(frame)
+        frames += self._resampler.resample(None)
+        return self._encode(frames)
@@ -2,11 +2,11 @@ import asyncio
 import base64
 import os
 
-import requests
 from fastapi import WebSocket
 
 from realtime_ai_character.audio.text_to_speech.base import TextToSpeech
-from realtime_ai_character.audio.text_to_speech.utils import MP3ToUlaw
+from realtime_ai_character.audio.text_to_speech.http_client import get_http_client
+from realtime_ai_character.audio.text_to_speech.utils import UlawTranscoder
 from realtime_ai_character.logger import get_logger
 from realtime_ai_character.utils import Singleton, timed
 
@@ -56,34 +56,42 @@ class XTTS(Singleton, TextToSpeech):
             "stream": first_sentence,
             "priority": priority,
         }
-        with requests.post(API_URL, json=data, headers=headers, stream=True) as response:
+        # twilio expects 8 kHz mu-law, XTTS streams mp3
+        transcoder = UlawTranscoder() if platform == "twilio" else None
+        client = get_http_client("xtts")
+        async with client.stream("POST", API_URL, json=data, headers=headers) as response:
             response.raise_for_status()
-            for chunk in response.iter_content(chunk_size=None):
+            async for chunk in response.aiter_bytes():
                 if not chunk:
                     continue
                 if tts_event.is_set():
                     # stop streaming audio
-                    break
-                if platform != "twilio":
+                    return
+                if transcoder is None:
                     await websocket.send_bytes(chunk)
-                    await asyncio.sleep(0.001)  # don't remove! this avoids sending in a batch
                 else:
-                    audio_bytes = MP3ToUlaw(chunk)
-                    audio_b64 = base64.b64encode(audio_bytes).decode()
-                    media_response = {
-                        "event": "media",
-                        "streamSid": sid,
-                        "media": {
-                            "payload": audio_b64,
-                        },
-                    }
-                    # "done" marker is sent to twilio to track if the audio has been completed.
-                    await websocket.send_json(media_response)
-                    mark = {
-                        "event": "mark",
-                        "streamSid": sid,
-                        "mark": {
-                            "name": "done",
-                        },
-                    }
-                    await websocket.send_json(mark)
+                    await self._send_twilio_audio(websocket, transcoder.feed(chunk), sid)
+        if transcoder is not None:
+            await self._send_twilio_audio(websocket, transcoder.flush(), sid)
+
+    async def _send_twilio_audio(self, websocket: WebSocket, audio_bytes: bytes, sid: str):
+        if not audio_bytes:
+            return
+        audio_b64 = base64.b64encode(audio_bytes).decode()
+        media_response = {
+            "event": "media",
+            "streamSid": sid,
+            "media": {
+                "payload": audio_b64,
+            },
+        }
+        # "done" marker is sent to twilio to track if the audio has been completed.
+        await websocket.send_json(media_response)
+        mark = {
+            "event": "mark",
+            "streamSid": sid,
+            "mark": {
+                "name": "done",
+            },
+        }
+        await websocket.send_json(mark)
@@ -9,12 +9,15 @@ import datetime
 import yaml
 from dotenv import load_dotenv
 from firebase_admin import auth
+from langchain.schema import Document
 from langchain.text_splitter import CharacterTextSplitter
 from llama_index.legacy.readers.file.base import SimpleDirectoryReader
 from readerwriterlock import rwlock
 
 from realtime_ai_character.database.chroma import get_chroma
-from realtime_ai_character.database.connection import get_db
+from realtime_ai_character.database.connection import SessionLocal
+from realtime_ai_character.database.lexical_index import get_lexical_retriever
+from realtime_ai_character.database.retrieval import invalidate_retrieval_cache
 from realtime_ai_character.logger import get_logger
 from realtime_ai_character.models.character import Character as CharacterModel
 from realtime_ai_character.utils import Character, Singleton
@@ -24,6 +27,38 @@ load_dotenv()
 logger = get_logger(__name__)
 
 
+def split_character_data(character_name: str, data_path: Path) -> list[Document]:
+    """Split the files under a character's data directory into retrieval chunks."""
+    loader = SimpleDirectoryReader(data_path.absolute().as_posix())
+    documents = loader.load_data()
+    text_splitter = CharacterTextSplitter(separator="\n", chunk_size=500, chunk_overlap=100)
+    return text_splitter.create_documents(
+        texts=[d.text for d in documents],
+        metadatas=[
+            {
+                "character_name": character_name,
+                "id": d.id_,
+            }
+            for d in documents
+        ],
+    )
+
+
+def character_data_dirs() -> list[tuple[str, Path]]:
+    """(character name, data directory) of every catalog character that has data."""
+    catalog_dir = Path(__file__).parent
+    configs = sorted(catalog_dir.glob("*/config.yaml")) + sorted(
+        catalog_dir.glob("community/*/config.yaml")
+    )
+    data_dirs = []
+    for config in configs:
+        data_path = config.parent / "data"
+        if data_path.is_dir():
+            with open(config) as f:
+                data_dirs.append((yaml.safe_load(f)["character_name"], data_path))
+    return data_dirs
+
+
 class CatalogManager(Singleton):
     def __init__(self):
         super().__init__()
@@ -33,7 +68,6 @@ class CatalogManager(Singleton):
         else:
             self.db = get_chroma(embedding=False)
             logger.warning("OPENAI_API_KEY not set, using Chroma without embedding.")
-        self.sql_db = next(get_db())
         self.sql_load_interval = 30
         self.sql_load_lock = rwlock.RWLockFair()
 
@@ -85,7 +119,8 @@ class CatalogManager(Singleton):
             self.characters[character_id] = character
 
             # Check if character already exists in the database
-            existing_character = self.sql_db.query(CharacterModel).filter(CharacterModel.id == character_id).first()
+            with SessionLocal() as sql_db:
+                existing_character = sql_db.query(CharacterModel).filter(CharacterModel.id == character_id).first()
             if existing_character is None:
                 # Save character to the database only if it doesn't exist
                 now = datetime.datetime.now()
@@ -104,27 +139,18 @@ class CatalogManager(Singleton):
                     created_at=now,
                     updated_at=now,
                 )
-                db_character.save(self.sql_db)
+                with SessionLocal() as sql_db:
+                    db_character.save(sql_db)
             else:
                 logger.info(f"Character {character_id} already exists in the database. Skipping insertion.")
 
             return character_name
 
     def load_data(self, character_name: str, data_path: Path):
-        loader = SimpleDirectoryReader(data_path.absolute().as_posix())
-        documents = loader.load_data()
-        text_splitter = CharacterTextSplitter(separator="\n", chunk_size=500, chunk_overlap=100)
-        docs = text_splitter.create_documents(
-            texts=[d.text for d in documents],
-            metadatas=[
-                {
-                    "character_name": character_name,
-                    "id": d.id_,
-                }
-                for d in documents
-            ],
-        )
+        docs = split_character_data(character_name, data_path)
         self.db.add_documents(docs)
+        get_lexical_retriever().set_documents(character_name, docs)
+        invalidate_retrieval_cache(character_name)
 
     def load_characters(self, source: str):
         """
@@ -152,7 +178,9 @@ class CatalogManager(Singleton):
 
     def load_character_from_sql_database(self):
         logger.info("Started loading characters from SQL database")
-        character_models = self.sql_db.query(CharacterModel).all()
+        # a session per load, so the loop does not hold a connection between loads
+        with SessionLocal() as sql_db:
+            character_models = sql_db.query(CharacterModel).all()
 
         with self.sql_load_lock.gen_wlock():
             # delete all characters with location == 'database'
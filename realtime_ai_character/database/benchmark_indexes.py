@@ -0,0 +1,177 @@
+"""Benchmark the interactions queries with and without their indexes.
+
+Seeds a synthetic interactions table, then reports the query plan and latency of the
+session and user lookups before and after creating the indexes of the Interaction model.
+
+    python -m realtime_ai_character.database.benchmark_indexes --rows 200000
+
+Uses a temporary SQLite database unless --database-url is given, which also requires
+--force. The rows go into a separate benchmark_interactions table with the columns and
+indexes of interactions; the interactions table itself is never touched.
+"""
+import argparse
+import datetime
+import os
+import random
+import statistics
+import tempfile
+import time
+import uuid
+
+from sqlalchemy import create_engine, func, Index, MetaData, select, Table, text
+from sqlalchemy.engine import Engine
+
+from realtime_ai_character.models.interaction import Interaction
+
+
+SEED_BATCH_SIZE = 10000
+BENCHMARK_TABLE = "benchmark_interactions"
+
+
+def benchmark_table() -> tuple[Table, list[tuple[str, list[str]]]]:
+    """A copy of the interactions table without indexes, and the (name, columns) of its
+    indexes, under names of their own."""
+    table = Interaction.__table__.to_metadata(MetaData(), name=BENCHMARK_TABLE)
+    indexes = [
+        (
+            index.name.replace(Interaction.__tablename__, BENCHMARK_TABLE),
+            [column.name for column in index.columns],
+        )
+        for index in table.indexes
+    ]
+    table.indexes.clear()
+    return table, indexes
+
+
+def seed(engine: Engine, table: Table, rows: int, session_length: int, users: int):
+    table.drop(engine, checkfirst=True)
+    table.create(engine)
+
+    start = datetime.datetime(2024, 1, 1)
+    session_id, user_id = "", ""
+    batch = []
+    with engine.begin() as conn:
+        for i in range(rows):
+            if i % session_length == 0:
+                session_id = uuid.uuid4().hex
+                user_id = f"user-{random.randrange(users)}"
+            batch.append(
+                {
+                    "user_id": user_id,
+                    "session_id": session_id,
+                    "client_message_unicode": f"question {i}",
+                    "server_message_unicode": f"answer {i}",
+                    "timestamp": start + datetime.timedelta(seconds=i),
+                    "platform": "web",
+                    "action_type": "text",
+                    "character_id": "math_tutor",
+                    "language": "en-US",
+                    "message_id": uuid.uuid4().hex[:16],
+                }
+            )
+            if len(batch) == SEED_BATCH_SIZE:
+                conn.execute(table.insert(), batch)
+                batch = []
+        if batch:
+            conn.execute(table.insert(), batch)
+
+
+def queries(table: Table, session_id: str, user_id: str) -> dict:
+    latest = (
+        select(
+            table.c.session_id,
+            table.c.client_message_unicode,
+            table.c.timestamp,
+            func.row_number()
+            .over(partition_by=table.c.session_id, order_by=table.c.timestamp.desc())
+            .label("rn"),
+        )
+        .where(table.c.user_id == user_id)
+        .subquery()
+    )
+    in_session = select(table).where(table.c.session_id == session_id)
+    return {
+        "check_session_auth": in_session.limit(1),
+        "session_history": in_session.order_by(table.c.timestamp, table.c.id).limit(200),
+        "conversations": select(latest.c.session_id, latest.c.client_message_unicode)
+        .where(latest.c.rn == 1)
+        .order_by(latest.c.timestamp.desc()),
+    }
+
+
+def explain(engine: Engine, statement) -> list[str]:
+    sql = str(statement.compile(engine, compile_kwargs={"literal_binds": True}))
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    with engine.connect() as conn:
+        return [" ".join(str(column) for column in row) for row in conn.execute(text(prefix + sql))]
+
+
+def measure(engine: Engine, statement, repeat: int) -> float:
+    """Median latency in milliseconds."""
+    latencies = []
+    with engine.connect() as conn:
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            conn.execute(statement).fetchall()
+            latencies.append((time.perf_counter() - start_time) * 1000)
+    return statistics.median(latencies)
+
+
+def report(engine: Engine, statements: dict, repeat: int) -> dict[str, float]:
+    latencies = {}
+    for name, statement in statements.items():
+        latencies[name] = measure(engine, statement, repeat)
+        print(f"{name}: {latencies[name]:.2f} ms")
+        for line in explain(engine, statement):
+            print(f"    {line}")
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--session-length", type=int, default=20)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help=f"allow --database-url, where the {BENCHMARK_TABLE} table is replaced",
+    )
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    if database_url is None:
+        database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'benchmark.db')}"
+    elif not args.force:
+        parser.error(f"--database-url replaces its {BENCHMARK_TABLE} table, pass --force")
+    engine = create_engine(database_url)
+    table, indexes = benchmark_table()
+
+    print(f"Seeding {args.rows} interactions into {BENCHMARK_TABLE} of {database_url}")
+    seed(engine, table, args.rows, args.session_length, args.users)
+    with engine.connect() as conn:
+        session_id, user_id = conn.execute(
+            select(table.c.session_id, table.c.user_id).order_by(func.random()).limit(1)
+        ).one()
+    statements = queries(table, session_id, user_id)
+
+    print("\nWithout indexes")
+    before = report(engine, statements, args.repeat)
+    for name, columns in indexes:
+        Index(name, *[table.c[column] for column in columns]).create(engine)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    print("\nWith indexes")
+    after = report(engine, statements, args.repeat)
+
+    print("\nSpeedup")
+    for name in statements:
+        print(f"{name}: {before[name] / after[name]:.1f}x")
+    if args.database_url is not None:
+        table.drop(engine)
+
+
+if __name__ == "__main__":
+    main()
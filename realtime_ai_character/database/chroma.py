@@ -1,4 +1,7 @@
 import os
+import threading
+from functools import cache
+
 from dotenv import load_dotenv
 
 # Updated imports to use the new packages
@@ -12,27 +15,48 @@ load_dotenv()
 logger = get_logger(__name__)
 
 
-def get_chroma(embedding: bool = True):
-    if embedding:
-        openai_api_key = os.getenv("OPENAI_API_KEY")
-        if not openai_api_key:
-            raise Exception("OPENAI_API_KEY is required to generate embeddings")
-        if os.getenv("OPENAI_API_TYPE") == "azure":
-            embedding_function = OpenAIEmbeddings(
-                openai_api_key=openai_api_key,
-                deployment=os.getenv(
-                    "OPENAI_API_EMBEDDING_DEPLOYMENT_NAME", "text-embedding-ada-002"
-                ),
-                chunk_size=1,
-            )
-        else:
-            embedding_function = OpenAIEmbeddings(openai_api_key=openai_api_key)
-    else:
-        embedding_function = None
+# distance function of the collection: "l2" (Chroma's default), "cosine" or "ip"; only
+# applied when the collection is created
+CHROMA_DISTANCE = os.getenv("CHROMA_DISTANCE", "l2")
+
+_chromas: dict[bool, Chroma] = {}
+_chromas_lock = threading.Lock()
+
+
+def get_chroma(embedding: bool = True) -> Chroma:
+    """Return the process-wide Chroma client, with or without the embedding function.
+
+    The client and its embedding HTTP connections are shared by every session instead of
+    being created per connection.
+    """
+    chroma = _chromas.get(embedding)
+    if chroma is None:
+        with _chromas_lock:
+            chroma = _chromas.get(embedding)
+            if chroma is None:
+                chroma = _chromas[embedding] = _create_chroma(embedding)
+    return chroma
+
+
+@cache
+def get_embedding_function() -> OpenAIEmbeddings:
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if not openai_api_key:
+        raise Exception("OPENAI_API_KEY is required to generate embeddings")
+    if os.getenv("OPENAI_API_TYPE") == "azure":
+        return OpenAIEmbeddings(
+            openai_api_key=openai_api_key,
+            deployment=os.getenv("OPENAI_API_EMBEDDING_DEPLOYMENT_NAME", "text-embedding-ada-002"),
+            chunk_size=1,
+        )
+    return OpenAIEmbeddings(openai_api_key=openai_api_key)
+
 
+def _create_chroma(embedding: bool) -> Chroma:
     chroma = Chroma(
         collection_name="llm",
-        embedding_function=embedding_function,
+        embedding_function=get_embedding_function() if embedding else None,
         persist_directory="./chroma.db",
+        collection_metadata={"hnsw:space": CHROMA_DISTANCE},
     )
     return chroma
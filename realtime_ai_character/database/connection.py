@@ -1,21 +1,68 @@
+import asyncio
 import os
+from typing import Callable, TypeVar
 
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
 
 
 load_dotenv()
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "")
 
-connect_args = {"check_same_thread": False} if SQLALCHEMY_DATABASE_URL.startswith("sqlite") else {}
+# connections kept open, and opened on top of them under load
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+# seconds to wait for a free connection before failing
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# seconds after which a connection is replaced, before the server drops it
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args=connect_args)
+T = TypeVar("T")
+
+
+# most connections checked out at once, reported by pool_status
+_peak_checked_out = 0
+
+
+def _track_peak_checked_out(*args):
+    global _peak_checked_out
+    _peak_checked_out = max(_peak_checked_out, engine.pool.checkedout())
+
+
+if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+else:
+    engine = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=True,
+    )
+    event.listen(engine, "checkout", _track_peak_checked_out)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
+def pool_status() -> dict[str, float]:
+    """Connections of the pool in use, at most in use, idle and opened beyond its size,
+    and the share of the pool capacity in use."""
+    pool = engine.pool
+    status = {"checked_out": pool.checkedout()} if hasattr(pool, "checkedout") else {}
+    if hasattr(pool, "size"):
+        status.update(
+            peak_checked_out=_peak_checked_out,
+            size=pool.size(),
+            idle=pool.checkedin(),
+            overflow=pool.overflow(),
+            utilization=round(100 * pool.checkedout() / (DB_POOL_SIZE + DB_MAX_OVERFLOW), 1),
+        )
+    return status
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -24,6 +71,20 @@ def get_db():
         db.close()
 
 
+async def run_in_session(operation: Callable[[Session], T]) -> T:
+    """Run a database operation in a worker thread, with a session of its own.
+
+    The connection goes back to the pool as soon as the operation returns, instead of
+    being held by a long-lived session such as a websocket conversation.
+    """
+
+    def run() -> T:
+        with SessionLocal() as db:
+            return operation(db)
+
+    return await asyncio.to_thread(run)
+
+
 if __name__ == "__main__":
     print(SQLALCHEMY_DATABASE_URL)
     from realtime_ai_character.models.user import User
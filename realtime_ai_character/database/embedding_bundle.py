@@ -0,0 +1,138 @@
+import json
+import os
+from functools import cache
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from langchain.schema import Document
+
+from realtime_ai_character.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+EMBEDDING_BUNDLE_DIR = os.getenv("EMBEDDING_BUNDLE_DIR", "./embedding_bundle")
+
+BUNDLE_VERSION = 1
+VECTORS_FILE = "vectors.npy"
+METADATA_FILE = "metadata.json"
+
+
+class EmbeddingBundle:
+    """Precomputed chunks and embeddings of the character catalog, searched in process.
+
+    vectors.npy holds the unit-normalized embeddings of every chunk as a float32 matrix,
+    grouped by character. metadata.json maps each character to its [start, end) rows and
+    holds the chunk texts. The matrix is memory-mapped read-only, so all workers share
+    the same pages, and a search is a single matrix-vector product over the character's
+    rows.
+    """
+
+    def __init__(self, path: Path):
+        with open(path / METADATA_FILE) as f:
+            metadata = json.load(f)
+        if metadata.get("version") != BUNDLE_VERSION:
+            raise ValueError(f"Unsupported embedding bundle version: {metadata.get('version')}")
+        self.embedding_model: str = metadata["embedding_model"]
+        self.characters: dict[str, tuple[int, int]] = {
+            name: (start, end) for name, (start, end) in metadata["characters"].items()
+        }
+        self.chunks: list[dict] = metadata["chunks"]
+        self.vectors = np.load(path / VECTORS_FILE, mmap_mode="r")
+        if len(self.vectors) != len(self.chunks):
+            raise ValueError("Embedding bundle vectors and chunks do not match")
+
+    def __contains__(self, character_name: str) -> bool:
+        return character_name in self.characters
+
+    def search(
+        self, embedding: list[float], character_name: str, k: int = 4
+    ) -> list[tuple[Document, float]]:
+        """Return the top k chunks of a character with their cosine similarity."""
+        start, end = self.characters.get(character_name, (0, 0))
+        k = min(k, end - start)
+        if k <= 0:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+        scores = self.vectors[start:end] @ query
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            (
+                Document(
+                    page_content=self.chunks[start + i]["text"],
+                    metadata={"character_name": character_name, "id": self.chunks[start + i]["id"]},
+                ),
+                float(scores[i]),
+            )
+            for i in top
+        ]
+
+
+@cache
+def get_embedding_bundle() -> Optional[EmbeddingBundle]:
+    path = Path(EMBEDDING_BUNDLE_DIR)
+    if not (path / METADATA_FILE).exists():
+        return None
+    try:
+        bundle = EmbeddingBundle(path)
+    except Exception as e:
+        logger.warning(f"Failed to load embedding bundle from {path}: {e}")
+        return None
+    logger.info(
+        f"Loaded embedding bundle: {len(bundle.chunks)} chunks of "
+        f"{len(bundle.characters)} characters"
+    )
+    return bundle
+
+
+def build_bundle(output_dir: str = EMBEDDING_BUNDLE_DIR):
+    """Split and embed the data of every catalog character into a bundle at `output_dir`."""
+    from realtime_ai_character.character_catalog.catalog_manager import (
+        character_data_dirs,
+        split_character_data,
+    )
+    from realtime_ai_character.database.chroma import get_embedding_function
+
+    embedding_function = get_embedding_function()
+    chunks: list[dict] = []
+    vectors: list[list[float]] = []
+    characters: dict[str, list[int]] = {}
+    for character_name, data_path in character_data_dirs():
+        docs = split_character_data(character_name, data_path)
+        if not docs:
+            continue
+        start = len(chunks)
+        vectors += embedding_function.embed_documents([d.page_content for d in docs])
+        chunks += [{"id": d.metadata["id"], "text": d.page_content} for d in docs]
+        characters[character_name] = [start, len(chunks)]
+        logger.info(f"Embedded {len(docs)} chunks of {character_name}")
+
+    matrix = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms > 0, norms, 1)
+    metadata = {
+        "version": BUNDLE_VERSION,
+        "embedding_model": embedding_function.model,
+        "characters": characters,
+        "chunks": chunks,
+    }
+
+    # replace the files atomically; running workers keep the pages they have mapped
+    path = Path(output_dir)
+    path.mkdir(parents=True, exist_ok=True)
+    with open(path / (VECTORS_FILE + ".tmp"), "wb") as f:
+        np.save(f, matrix)
+    with open(path / (METADATA_FILE + ".tmp"), "w") as f:
+        json.dump(metadata, f)
+    os.replace(path / (VECTORS_FILE + ".tmp"), path / VECTORS_FILE)
+    os.replace(path / (METADATA_FILE + ".tmp"), path / METADATA_FILE)
+    logger.info(f"Wrote {len(chunks)} chunks of {len(characters)} characters to {path}")
+
+
+if __name__ == "__main__":
+    build_bundle()
@@ -0,0 +1,115 @@
+import math
+import re
+import threading
+from collections import Counter
+from typing import Optional
+
+import numpy as np
+from langchain.schema import Document
+
+from realtime_ai_character.logger import get_logger
+from realtime_ai_character.utils import Singleton
+
+
+logger = get_logger(__name__)
+
+# numbers, words and arithmetic operators are separate terms, so "7x8" matches "7 x 8"
+_TERM = re.compile(r"\d+|[^\W\d_]+|[×*÷/+\-=]")
+_OPERATOR_ALIASES = {"×": "x", "*": "x", "÷": "/"}
+
+
+def tokenize(text: str) -> list[str]:
+    return [_OPERATOR_ALIASES.get(term, term) for term in _TERM.findall(text.lower())]
+
+
+class LexicalIndex:
+    """Okapi BM25 inverted index over the chunks of one character."""
+
+    def __init__(self, docs: list[Document], k1: float = 1.5, b: float = 0.75):
+        self.docs = docs
+        self.k1 = k1
+        self.b = b
+        postings: dict[str, tuple[list[int], list[int]]] = {}
+        lengths = []
+        for i, doc in enumerate(docs):
+            terms = Counter(tokenize(doc.page_content))
+            lengths.append(sum(terms.values()))
+            for term, frequency in terms.items():
+                doc_ids, frequencies = postings.setdefault(term, ([], []))
+                doc_ids.append(i)
+                frequencies.append(frequency)
+        self.postings = {
+            term: (np.array(doc_ids), np.array(frequencies, dtype=np.float32))
+            for term, (doc_ids, frequencies) in postings.items()
+        }
+        self.lengths = np.array(lengths, dtype=np.float32)
+        self.average_length = float(self.lengths.mean()) if docs else 0.0
+
+    def idf(self, term: str) -> float:
+        frequency = len(self.postings[term][0])
+        return math.log(1 + (len(self.docs) - frequency + 0.5) / (frequency + 0.5))
+
+    def search(self, query: str, k: int = 4) -> list[tuple[Document, float]]:
+        """Return the top k chunks matching any query term, with their BM25 score."""
+        scores = np.zeros(len(self.docs), dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            doc_ids, frequencies = self.postings[term]
+            length_norm = 1 - self.b + self.b * self.lengths[doc_ids] / self.average_length
+            scores[doc_ids] += (
+                self.idf(term) * frequencies * (self.k1 + 1) / (frequencies + self.k1 * length_norm)
+            )
+        matched = np.flatnonzero(scores)
+        top = matched[np.argsort(-scores[matched])][:k]
+        return [(self.docs[i], float(scores[i])) for i in top]
+
+
+class LexicalRetriever(Singleton):
+    """Per-character BM25 indexes, built from the same chunks as the vector store.
+
+    Needs no embedding service: the catalog data is split locally on first use.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self.indexes: Optional[dict[str, LexicalIndex]] = None
+
+    def _build(self) -> dict[str, LexicalIndex]:
+        from realtime_ai_character.character_catalog.catalog_manager import (
+            character_data_dirs,
+            split_character_data,
+        )
+
+        indexes = {}
+        for character_name, data_path in character_data_dirs():
+            indexes[character_name] = LexicalIndex(
+                split_character_data(character_name, data_path)
+            )
+        logger.info(f"Built lexical indexes of {len(indexes)} characters")
+        return indexes
+
+    def load(self) -> dict[str, LexicalIndex]:
+        """Build the indexes on first use; reads and splits every character's data."""
+        if self.indexes is None:
+            with self._lock:
+                if self.indexes is None:
+                    self.indexes = self._build()
+        return self.indexes
+
+    def set_documents(self, character_name: str, docs: list[Document]):
+        index = LexicalIndex(docs)
+        with self._lock:
+            if self.indexes is not None:
+                self.indexes[character_name] = index
+
+    def search(self, query: str, character_name: str, k: int = 4) -> list[tuple[Document, float]]:
+        index = self.load().get(character_name)
+        if index is None:
+            return []
+        return index.search(query, k=k)
+
+
+def get_lexical_retriever() -> LexicalRetriever:
+    return LexicalRetriever.get_instance()
@@ -0,0 +1,234 @@
+import asyncio
+import math
+import os
+import threading
+from typing import Optional
+
+from cachetools import TTLCache
+from langchain.schema import Document
+
+from realtime_ai_character.database.chroma import (
+    CHROMA_DISTANCE,
+    get_chroma,
+    get_embedding_function,
+)
+from realtime_ai_character.database.embedding_bundle import get_embedding_bundle
+from realtime_ai_character.database.lexical_index import get_lexical_retriever
+from realtime_ai_character.logger import get_logger
+from realtime_ai_character.utils import Character, Singleton, timed
+
+
+logger = get_logger(__name__)
+
+# number of documents retrieved per query
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "4"))
+# documents with a relevance score (0 to 1) below this are dropped
+RETRIEVAL_SCORE_THRESHOLD = float(os.getenv("RETRIEVAL_SCORE_THRESHOLD", "0"))
+
+# "vector", "lexical" (BM25, no embedding service) or "hybrid" (both, scores fused)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector")
+# weight of the vector score in hybrid mode, the lexical score gets the rest
+RETRIEVAL_HYBRID_VECTOR_WEIGHT = float(os.getenv("RETRIEVAL_HYBRID_VECTOR_WEIGHT", "0.5"))
+
+RETRIEVAL_CACHE_ENABLED = os.getenv("RETRIEVAL_CACHE_ENABLED", "true").lower() == "true"
+RETRIEVAL_EMBEDDING_CACHE_SIZE = int(os.getenv("RETRIEVAL_EMBEDDING_CACHE_SIZE", "2048"))
+RETRIEVAL_CONTEXT_CACHE_SIZE = int(os.getenv("RETRIEVAL_CONTEXT_CACHE_SIZE", "2048"))
+# seconds
+RETRIEVAL_CACHE_TTL = float(os.getenv("RETRIEVAL_CACHE_TTL", "3600"))
+
+
+def relevance_score(distance: float, space: str = CHROMA_DISTANCE) -> float:
+    """Relevance (0 to 1 for normalized embeddings) of a Chroma distance, as LangChain
+    computes it for the distance function of the collection."""
+    if space == "l2":
+        return 1.0 - distance / math.sqrt(2)
+    if space == "ip" and distance <= 0:
+        return -distance
+    # cosine distance, or inner product distance of 1 - similarity
+    return 1.0 - distance
+
+
+def normalize_query(query: str) -> str:
+    """Key for queries that only differ in case, spacing or final punctuation."""
+    return " ".join(query.lower().split()).rstrip(".!?")
+
+
+class RetrievalService(Singleton):
+    """Finds the context documents of a character for the LLM prompt.
+
+    The character filter is part of the vector query, so the top k documents all belong
+    to the character. The query, including the embedding request, runs in a worker
+    thread and does not block other sessions on the event loop.
+
+    Short turns repeat a lot ("yes", "I don't know"), so query embeddings and the
+    context of each (character, query) are cached for RETRIEVAL_CACHE_TTL seconds.
+
+    Characters in the precomputed embedding bundle are searched in process, without
+    opening Chroma at all. With RETRIEVAL_MODE "lexical" no embedding is needed, and
+    "hybrid" keeps answering from the lexical index when the embedding service fails.
+    """
+
+    def __init__(self, mode: str = RETRIEVAL_MODE):
+        super().__init__()
+        self.mode = mode
+        self.embedding_function = get_embedding_function() if mode != "lexical" else None
+        self.bundle = get_embedding_bundle() if mode != "lexical" else None
+        if self.bundle is not None and self.bundle.embedding_model != self.embedding_function.model:
+            logger.warning(
+                f"Ignoring embedding bundle built with {self.bundle.embedding_model}, "
+                f"queries are embedded with {self.embedding_function.model}"
+            )
+            self.bundle = None
+        self._lock = threading.Lock()
+        self.embedding_cache: TTLCache = TTLCache(
+            maxsize=RETRIEVAL_EMBEDDING_CACHE_SIZE, ttl=RETRIEVAL_CACHE_TTL
+        )
+        self.context_cache: TTLCache = TTLCache(
+            maxsize=RETRIEVAL_CONTEXT_CACHE_SIZE, ttl=RETRIEVAL_CACHE_TTL
+        )
+        self.embedding_hits = 0
+        self.embedding_misses = 0
+        self.context_hits = 0
+        self.context_misses = 0
+
+    async def embed_query(self, query: str) -> list[float]:
+        key = normalize_query(query)
+        with self._lock:
+            embedding = self.embedding_cache.get(key) if RETRIEVAL_CACHE_ENABLED else None
+        if embedding is not None:
+            self.embedding_hits += 1
+            return embedding
+        self.embedding_misses += 1
+        embedding = await asyncio.to_thread(self.embedding_function.embed_query, key)
+        if RETRIEVAL_CACHE_ENABLED:
+            with self._lock:
+                self.embedding_cache[key] = embedding
+        return embedding
+
+    async def search(
+        self,
+        query: str,
+        character_name: str,
+        k: int = RETRIEVAL_K,
+        score_threshold: Optional[float] = None,
+    ) -> list[Document]:
+        if score_threshold is None:
+            score_threshold = RETRIEVAL_SCORE_THRESHOLD
+        if self.mode == "lexical":
+            results = await self.lexical_search(query, character_name, k)
+        elif self.mode == "hybrid":
+            results = await self.hybrid_search(query, character_name, k)
+        else:
+            results = await self.vector_search(query, character_name, k)
+        return [doc for doc, score in results if score >= score_threshold]
+
+    async def vector_search(
+        self, query: str, character_name: str, k: int
+    ) -> list[tuple[Document, float]]:
+        """Top k documents with their relevance score, from 0 to 1."""
+        embedding = await self.embed_query(query)
+        if self.bundle is not None and character_name in self.bundle:
+            # cosine similarity of a few hundred rows, cheaper than a thread hop
+            return self.bundle.search(embedding, character_name, k=k)
+        db = get_chroma()
+        results = await asyncio.to_thread(
+            db.similarity_search_by_vector_with_relevance_scores,
+            embedding,
+            k=k,
+            filter={"character_name": character_name},
+        )
+        # the results carry distances, convert them to relevance scores
+        return [(doc, relevance_score(distance)) for doc, distance in results]
+
+    async def lexical_search(
+        self, query: str, character_name: str, k: int
+    ) -> list[tuple[Document, float]]:
+        """Top k documents with their BM25 score relative to the best match, from 0 to 1."""
+        retriever = get_lexical_retriever()
+        if retriever.indexes is None:
+            await asyncio.to_thread(retriever.load)
+        results = retriever.search(query, character_name, k=k)
+        if not results:
+            return []
+        top_score = results[0][1]
+        return [(doc, score / top_score) for doc, score in results]
+
+    async def hybrid_search(
+        self, query: str, character_name: str, k: int
+    ) -> list[tuple[Document, float]]:
+        # fuse from a deeper candidate list, the best documents of one side may be
+        # mediocre on the other
+        lexical_results = await self.lexical_search(query, character_name, 2 * k)
+        try:
+            vector_results = await self.vector_search(query, character_name, 2 * k)
+        except Exception as e:
+            logger.warning(f"Vector search failed, using lexical results only: {e}")
+            return lexical_results[:k]
+        scores: dict[str, float] = {}
+        docs: dict[str, Document] = {}
+        for results, weight in (
+            (vector_results, RETRIEVAL_HYBRID_VECTOR_WEIGHT),
+            (lexical_results, 1 - RETRIEVAL_HYBRID_VECTOR_WEIGHT),
+        ):
+            for doc, score in results:
+                docs[doc.page_content] = doc
+                scores[doc.page_content] = scores.get(doc.page_content, 0.0) + weight * score
+        ranked = sorted(scores, key=scores.__getitem__, reverse=True)[:k]
+        return [(docs[content], scores[content]) for content in ranked]
+
+    @timed
+    async def get_context(self, query: str, character: Character) -> str:
+        key = (character.name, normalize_query(query))
+        with self._lock:
+            context = self.context_cache.get(key) if RETRIEVAL_CACHE_ENABLED else None
+        if context is not None:
+            self.context_hits += 1
+            return context
+        self.context_misses += 1
+        try:
+            docs = await self.search(query, character.name)
+        except Exception as e:
+            # answer without context rather than failing the reply
+            logger.error(f"Failed to retrieve context for {character.name}: {e}")
+            return ""
+        logger.info(f"Found {len(docs)} documents")
+        context = "\n".join([d.page_content for d in docs])
+        if RETRIEVAL_CACHE_ENABLED:
+            with self._lock:
+                self.context_cache[key] = context
+        return context
+
+    def invalidate(self, character_name: Optional[str] = None):
+        """Drop cached contexts of a character, or of all characters, after its documents
+        changed. Query embeddings do not depend on the documents and are kept."""
+        with self._lock:
+            if character_name is None:
+                self.context_cache.clear()
+                return
+            for key in [key for key in self.context_cache if key[0] == character_name]:
+                self.context_cache.pop(key, None)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "embedding_hits": self.embedding_hits,
+            "embedding_misses": self.embedding_misses,
+            "context_hits": self.context_hits,
+            "context_misses": self.context_misses,
+        }
+
+
+def get_retrieval_service() -> RetrievalService:
+    return RetrievalService.get_instance()
+
+
+def invalidate_retrieval_cache(character_name: Optional[str] = None):
+    """Invalidate cached contexts, if the retrieval service has been created."""
+    service = RetrievalService._instances.get(RetrievalService)
+    if service is not None:
+        service.invalidate(character_name)
+
+
+def retrieval_cache_stats() -> dict[str, int]:
+    """Stats of the retrieval caches, if the retrieval service has been created."""
+    service = RetrievalService._instances.get(RetrievalService)
+    return service.stats() if service is not None else {}
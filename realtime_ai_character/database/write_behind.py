@@ -0,0 +1,130 @@
+import asyncio
+import datetime
+import os
+import time
+from typing import Optional
+
+from realtime_ai_character.database.base import Base
+from realtime_ai_character.logger import get_logger
+from realtime_ai_character.utils import Singleton
+
+
+logger = get_logger(__name__)
+
+# records are written once this many are queued
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "100"))
+# or at the latest this many seconds after the first of them was queued
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "1.0"))
+WRITE_BEHIND_MAX_RETRIES = int(os.getenv("WRITE_BEHIND_MAX_RETRIES", "3"))
+
+
+def _write(records: list[Base]):
+    from realtime_ai_character.database.connection import SessionLocal
+
+    with SessionLocal() as db:
+        db.add_all(records)
+        db.commit()
+
+
+class WriteBehindQueue(Singleton):
+    """Process-wide queue that writes Interaction and Feedback records in batches.
+
+    `put` returns immediately, so database latency never delays a reply. A background
+    task commits the queued records in one transaction once WRITE_BEHIND_BATCH_SIZE are
+    queued or WRITE_BEHIND_FLUSH_INTERVAL has passed, retrying with backoff. A batch that
+    keeps failing is written record by record, so one bad record does not lose the rest.
+    """
+
+    def __init__(self):
+        self.records: list[Base] = []
+        self.written = 0
+        self.dropped = 0
+        # gauges reported by `stats`
+        self.peak_queued = 0
+        self.last_flush_seconds = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        # direct writes of records put after `close`
+        self._late_writes: set[asyncio.Task] = set()
+
+    def put(self, record: Base):
+        # stamp the record now rather than with the column default at insert time, which
+        # is up to WRITE_BEHIND_FLUSH_INTERVAL later, more after retries, and the same for
+        # a whole batch
+        now = datetime.datetime.utcnow()
+        for column in ("timestamp", "created_at"):
+            if hasattr(record, column) and getattr(record, column) is None:
+                setattr(record, column, now)
+        if self._closing:
+            # nothing flushes the queue after close, so write the record on its own
+            logger.warning(f"Writing {type(record).__name__} record put after close")
+            task = asyncio.create_task(self._write_batch([record]))
+            self._late_writes.add(task)
+            task.add_done_callback(self._late_writes.discard)
+            return
+        self.records.append(record)
+        self.peak_queued = max(self.peak_queued, len(self.records))
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        if len(self.records) >= WRITE_BEHIND_BATCH_SIZE:
+            self._wakeup.set()
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=WRITE_BEHIND_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        while self.records:
+            batch = self.records[:WRITE_BEHIND_BATCH_SIZE]
+            del self.records[:WRITE_BEHIND_BATCH_SIZE]
+            start_time = time.perf_counter()
+            await self._write_batch(batch)
+            self.last_flush_seconds = time.perf_counter() - start_time
+
+    async def _write_batch(self, batch: list[Base]):
+        for attempt in range(WRITE_BEHIND_MAX_RETRIES):
+            try:
+                await asyncio.to_thread(_write, batch)
+                self.written += len(batch)
+                return
+            except Exception as e:
+                logger.warning(
+                    f"Failed to write {len(batch)} records (attempt {attempt + 1}): {e}"
+                )
+                await asyncio.sleep(0.5 * 2**attempt)
+        for record in batch:
+            try:
+                await asyncio.to_thread(_write, [record])
+                self.written += 1
+            except Exception as e:
+                self.dropped += 1
+                logger.error(f"Dropped {type(record).__name__} record: {e}")
+
+    async def close(self):
+        """Write everything still queued; called on shutdown."""
+        self._closing = True
+        if self._task is not None and not self._task.done():
+            self._wakeup.set()
+            await self._task
+        await self.flush()
+        logger.info(f"Write-behind queue drained: {self.stats()}")
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "queued": len(self.records),
+            "peak_queued": self.peak_queued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "last_flush_seconds": round(self.last_flush_seconds, 3),
+        }
+
+
+def get_write_behind_queue() -> WriteBehindQueue:
+    return WriteBehindQueue.get_instance()
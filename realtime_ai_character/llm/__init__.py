@@ -1,18 +1,55 @@
 import os
+import threading
 from functools import cache
 
 from dotenv import load_dotenv
 from langchain.chat_models.base import BaseChatModel
 
 from realtime_ai_character.llm.base import LLM
+from realtime_ai_character.logger import get_logger
 
 
 load_dotenv()
+logger = get_logger(__name__)
+
+
+_llms: dict[str, LLM] = {}
+_llms_lock = threading.Lock()
 
 
 def get_llm(model="gpt-4o") -> LLM:
-    model = os.getenv("LLM_MODEL_USE", model)
+    """Return the process-wide LLM of a model, creating it on first use.
 
+    LLMs keep no per-session state, so all connections share one instance together with
+    its HTTP connection pool and vector store client.
+    """
+    model = os.getenv("LLM_MODEL_USE", model)
+    llm = _llms.get(model)
+    if llm is None:
+        with _llms_lock:
+            llm = _llms.get(model)
+            if llm is None:
+                llm = _llms[model] = _create_serving_llm(model)
+                logger.info(f"Created LLM [{model}]")
+    return llm
+
+
+def _create_serving_llm(model: str) -> LLM:
+    """The backend of a model, hedged and routed when configured."""
+    from realtime_ai_character.llm.hedged_llm import HedgedLlm, LLM_HEDGE_MODEL
+    from realtime_ai_character.llm.routed_llm import LLM_ROUTER_FAST_MODEL, RoutedLlm
+
+    llm = _create_llm(model)
+    if LLM_HEDGE_MODEL and LLM_HEDGE_MODEL != model:
+        llm = HedgedLlm(primary=llm, secondary=_create_llm(LLM_HEDGE_MODEL))
+        logger.info(f"Hedging LLM [{model}] with [{LLM_HEDGE_MODEL}]")
+    if LLM_ROUTER_FAST_MODEL and LLM_ROUTER_FAST_MODEL != model:
+        llm = RoutedLlm(fast=_create_llm(LLM_ROUTER_FAST_MODEL), strong=llm)
+        logger.info(f"Routing simple turns of LLM [{model}] to [{LLM_ROUTER_FAST_MODEL}]")
+    return llm
+
+
+def _create_llm(model: str) -> LLM:
     if model.startswith("gpt"):
         from realtime_ai_character.llm.openai_llm import OpenaiLlm
 
@@ -40,32 +77,15 @@ def get_llm(model="gpt-4o") -> LLM:
 
 
 def get_chat_model(model="gpt-4o") -> BaseChatModel:
-    model = os.getenv("LLM_MODEL_USE", model)
-
-    if model.startswith("gpt"):
-        from realtime_ai_character.llm.openai_llm import OpenaiLlm
-
-        return OpenaiLlm(model=model).chat_open_ai
-    elif model.startswith("claude"):
-        from realtime_ai_character.llm.anthropic_llm import AnthropicLlm
-
-        return AnthropicLlm(model=model).chat_anthropic
-    elif "localhost" in model:
-        # Currently use llama2-wrapper to run local llama models
-        local_llm_url = os.getenv("LOCAL_LLM_URL", "")
-        if local_llm_url:
-            from realtime_ai_character.llm.local_llm import LocalLlm
+    return get_llm_chat_model(get_llm(model))
 
-            return LocalLlm(url=local_llm_url).chat_open_ai
-        else:
-            raise ValueError("LOCAL_LLM_URL not set")
-    elif "llama" in model:
-        # Currently use Anyscale to support llama models
-        from realtime_ai_character.llm.anyscale_llm import AnysacleLlm
 
-        return AnysacleLlm(model=model).chat_open_ai
-    else:
-        raise ValueError(f"Invalid llm model: {model}")
+def get_llm_chat_model(llm: LLM) -> BaseChatModel:
+    # hedged and routed LLMs use the chat model of their primary backend
+    while hasattr(llm, "primary"):
+        llm = llm.primary
+    # AnthropicLlm names its chat model differently from the OpenAI compatible LLMs
+    return getattr(llm, "chat_anthropic", None) or getattr(llm, "chat_open_ai")
 
 
 @cache
@@ -1,11 +1,22 @@
 from typing import Optional
 
 from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
-from langchain.chat_models import ChatAnthropic
 from langchain.schema import BaseMessage, HumanMessage
 
-from realtime_ai_character.database.chroma import get_chroma
-from realtime_ai_character.llm.base import AsyncCallbackAudioHandler, AsyncCallbackTextHandler, LLM
+from realtime_ai_character.database.retrieval import get_retrieval_service
+from realtime_ai_character.llm.base import (
+    AsyncCallbackAudioHandler,
+    AsyncCallbackTextHandler,
+    LLM,
+    LLM_STDOUT_ECHO,
+)
+from realtime_ai_character.llm.prompt_budget import fit_context
+from realtime_ai_character.llm.prompt_cache import (
+    add_cache_breakpoints,
+    ANTHROPIC_PROMPT_CACHING_BETA,
+    PROMPT_CACHE_ENABLED,
+    record_prompt_cache_usage,
+)
 from realtime_ai_character.logger import get_logger
 from realtime_ai_character.utils import Character, timed
 
@@ -15,9 +26,28 @@ logger = get_logger(__name__)
 
 class AnthropicLlm(LLM):
     def __init__(self, model):
-        self.chat_anthropic = ChatAnthropic(model_name=model, temperature=0.5, streaming=True)
+        try:
+            # the Messages API client supports prompt caching
+            from langchain_anthropic import ChatAnthropic
+
+            self.chat_anthropic = ChatAnthropic(
+                model_name=model,
+                temperature=0.5,
+                streaming=True,
+                default_headers=(
+                    {"anthropic-beta": ANTHROPIC_PROMPT_CACHING_BETA}
+                    if PROMPT_CACHE_ENABLED
+                    else None
+                ),
+            )
+            self.prompt_caching = True
+        except ImportError:
+            from langchain.chat_models import ChatAnthropic
+
+            self.chat_anthropic = ChatAnthropic(model_name=model, temperature=0.5, streaming=True)
+            self.prompt_caching = False
         self.config = {"model": model, "temperature": 0.5, "streaming": True}
-        self.db = get_chroma()
+        self.retrieval = get_retrieval_service()
 
     def get_config(self):
         return self.config
@@ -32,11 +62,14 @@ class AnthropicLlm(LLM):
         callback: AsyncCallbackTextHandler,
         audioCallback: Optional[AsyncCallbackAudioHandler] = None,
         metadata: Optional[dict] = None,
+        context: Optional[str] = None,
         *args,
         **kwargs,
     ) -> str:
-        # 1. Generate context
-        context = self._generate_context(user_input, character)
+        # 1. Generate context, unless it was retrieved ahead of time
+        if context is None:
+            context = await self._generate_context(user_input, character)
+        context = fit_context(context, self.config["model"])
 
         # 2. Add user input to history
         history.append(
@@ -46,19 +79,19 @@ class AnthropicLlm(LLM):
         )
 
         # 3. Generate response
-        callbacks = [callback, StreamingStdOutCallbackHandler()]
+        callbacks = [callback]
+        if LLM_STDOUT_ECHO:
+            callbacks.append(StreamingStdOutCallbackHandler())
         if audioCallback is not None:
             callbacks.append(audioCallback)
+        if self.prompt_caching:
+            history = add_cache_breakpoints(history)
         response = await self.chat_anthropic.agenerate(
             [history], callbacks=callbacks, metadata=metadata
         )
         logger.info(f"Response: {response}")
+        record_prompt_cache_usage(response)
         return response.generations[0][0].text
 
-    def _generate_context(self, query, character: Character) -> str:
-        docs = self.db.similarity_search(query)
-        docs = [d for d in docs if d.metadata["character_name"] == character.name]
-        logger.info(f"Found {len(docs)} documents")
-
-        context = "\n".join([d.page_content for d in docs])
-        return context
+    async def _generate_context(self, query, character: Character) -> str:
+        return await self.retrieval.get_context(query, character)
@@ -1,15 +1,16 @@
 import asyncio
-import re
+import os
 from abc import ABC, abstractmethod
 from typing import Callable, Coroutine, Optional
 
-import emoji
 from fastapi import WebSocket
 from langchain.callbacks.base import AsyncCallbackHandler
 from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
 from langchain.schema.messages import BaseMessage
 
 from realtime_ai_character.audio.text_to_speech.base import TextToSpeech
+from realtime_ai_character.audio.text_to_speech.pipeline import TTSPipeline
+from realtime_ai_character.audio.text_to_speech.segmenter import get_segmenter
 from realtime_ai_character.logger import get_logger
 from realtime_ai_character.utils import Character, get_timer, timed
 
@@ -18,6 +19,9 @@ logger = get_logger(__name__)
 
 timer = get_timer()
 
+# echo every streamed token to stdout, for debugging
+LLM_STDOUT_ECHO = os.getenv("LLM_STDOUT_ECHO", "false").lower() == "true"
+
 StreamingStdOutCallbackHandler.on_chat_model_start = lambda *args, **kwargs: None
 
 
@@ -57,6 +61,9 @@ class AsyncCallbackTextHandler(AsyncCallbackHandler):
 
 
 class AsyncCallbackAudioHandler(AsyncCallbackHandler):
+    # run in the LLM task so the TTS pipeline is cancelled together with the reply
+    run_inline = True
+
     def __init__(
         self,
         text_to_speech: TextToSpeech,
@@ -66,13 +73,18 @@ class AsyncCallbackAudioHandler(AsyncCallbackHandler):
         language: str = "en-US",
         sid: str = "",
         platform: str = "",
+        segmentation_policy: Optional[str] = None,
         *args,
         **kwargs
     ):
         super().__init__(*args, **kwargs)
         self.text_to_speech = text_to_speech
         self.websocket = websocket
-        self.current_sentence = ""
+        # strips emojis and cuts the token stream into TTS chunks; the character's policy
+        # takes precedence over the engine's
+        self.segmenter = get_segmenter(
+            segmentation_policy or text_to_speech.segmentation_policy
+        )
         self.voice_id = voice_id
         self.language = language
         self.is_reply = False  # the start of the reply. i.e. the substring after '>'
@@ -81,80 +93,38 @@ class AsyncCallbackAudioHandler(AsyncCallbackHandler):
         self.platform = platform
         # optimization: trade off between latency and quality for the first sentence
         self.sentence_idx = 0
+        self.pipeline = TTSPipeline(
+            text_to_speech,
+            websocket,
+            tts_event,
+            voice_id=voice_id,
+            language=language,
+            sid=sid,
+            platform=platform,
+        )
 
     async def on_chat_model_start(self, *args, **kwargs):
         pass
 
     async def on_llm_new_token(self, token: str, *args, **kwargs):
         timer.log("LLM First Token", lambda: timer.start("LLM First Sentence"))
-        # skip emojis
-        token = emoji.replace_emoji(token, "")
-        token = self.text_regulator(token)
-        if not token:
-            return
-        for char in token:
-            await self._on_llm_new_character(char)
-
-    async def _on_llm_new_character(self, char: str):
         # send to TTS in sentences
-        punctuation = False
-        if (
-            # English punctuations
-            (
-                char == " "
-                and self.current_sentence != ""
-                and self.current_sentence[-1] in {".", "?", "!"}
-            )
-            # Chinese/Japanese/Korean punctuations
-            or (char in {"。", "？", "！"})
-            # newline
-            or (char in {"\n", "\r", "\t"})
-        ):
-            punctuation = True
-
-        self.current_sentence += char
-
-        if punctuation and self.current_sentence.strip():
-            first_sentence = self.sentence_idx == 0
-            if first_sentence:
-                timer.log("LLM First Sentence", lambda: timer.start("TTS First Sentence"))
-            await self.text_to_speech.stream(
-                text=self.current_sentence.strip(),
-                websocket=self.websocket,
-                tts_event=self.tts_event,
-                voice_id=self.voice_id,
-                first_sentence=first_sentence,
-                language=self.language,
-                sid=self.twilio_stream_id,
-                platform=self.platform,
-                priority=self.sentence_idx,
-            )
-            self.current_sentence = ""
-            timer.log("TTS First Sentence")
-            self.sentence_idx += 1
+        for sentence in self.segmenter.feed(token):
+            self._put_sentence(sentence)
 
-    async def on_llm_end(self, *args, **kwargs):
+    def _put_sentence(self, sentence: str):
         first_sentence = self.sentence_idx == 0
-        if self.current_sentence.strip():
-            await self.text_to_speech.stream(
-                text=self.current_sentence.strip(),
-                websocket=self.websocket,
-                tts_event=self.tts_event,
-                voice_id=self.voice_id,
-                first_sentence=first_sentence,
-                language=self.language,
-                priority=self.sentence_idx,
-            )
-
-    def text_regulator(self, text):
-        pattern = (
-            r"[\u200B\u200C\u200D\u200E\u200F\uFEFF\u00AD\u2060\uFFFC\uFFFD]"  # Format characters
-            r"|[\uFE00-\uFE0F]"  # Variation selectors
-            r"|[\uE000-\uF8FF]"  # Private use area
-            r"|[\uFFF0-\uFFFF]"  # Specials
-        )
-        filtered_text = re.sub(pattern, "", text)
-        return filtered_text
+        if first_sentence:
+            timer.log("LLM First Sentence", lambda: timer.start("TTS First Sentence"))
+            timer.record("TTS First Chunk Length", len(sentence), unit=" chars")
+        timer.record("TTS Chunk Length", len(sentence), unit=" chars")
+        self.pipeline.put(sentence, first_sentence=first_sentence, priority=self.sentence_idx)
+        self.sentence_idx += 1
+
+    async def on_llm_end(self, *args, **kwargs):
+        for sentence in self.segmenter.flush():
+            self._put_sentence(sentence)
+        await self.pipeline.join()
 
 
 class LLM(ABC):
@@ -169,6 +139,7 @@ class LLM(ABC):
         callback: AsyncCallbackTextHandler,
         audioCallback: Optional[AsyncCallbackAudioHandler] = None,
         metadata: Optional[dict] = None,
+        context: Optional[str] = None,
         *args,
         **kwargs
     ):
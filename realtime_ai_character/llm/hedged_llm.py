@@ -0,0 +1,222 @@
+import asyncio
+import os
+import time
+from typing import Optional
+
+from langchain.callbacks.base import AsyncCallbackHandler
+from langchain.schema import BaseMessage
+
+from realtime_ai_character.database.retrieval import get_retrieval_service
+from realtime_ai_character.llm.base import AsyncCallbackAudioHandler, AsyncCallbackTextHandler, LLM
+from realtime_ai_character.llm.speculation import GatedCallbackHandler, SpeculationGate
+from realtime_ai_character.logger import get_logger
+from realtime_ai_character.utils import Character, get_timer, timed
+
+
+logger = get_logger(__name__)
+
+timer = get_timer()
+
+# model started when the primary model sends no token within the deadline, empty to disable
+LLM_HEDGE_MODEL = os.getenv("LLM_HEDGE_MODEL", "")
+# seconds
+LLM_HEDGE_DEADLINE = float(os.getenv("LLM_HEDGE_DEADLINE", "1.5"))
+
+
+class _RaceHandler(GatedCallbackHandler):
+    """Gated text handler that tells when its backend started to respond."""
+
+    def __init__(self, handler: AsyncCallbackHandler, opened: asyncio.Event):
+        super().__init__(handler, opened)
+        self.responded = asyncio.Event()
+        self.tokens = 0
+
+    async def on_llm_new_token(self, token: str, *args, **kwargs):
+        self.tokens += 1
+        self.responded.set()
+        await super().on_llm_new_token(token, *args, **kwargs)
+
+    async def on_llm_end(self, *args, **kwargs):
+        # an empty reply has no tokens
+        self.responded.set()
+        await super().on_llm_end(*args, **kwargs)
+
+
+class _Contestant:
+    """One backend generating the reply, with its callbacks held back until it wins."""
+
+    def __init__(
+        self,
+        name: str,
+        llm: LLM,
+        history: list[BaseMessage],
+        callback: AsyncCallbackTextHandler,
+        audioCallback: Optional[AsyncCallbackAudioHandler],
+        **kwargs,
+    ):
+        self.name = name
+        self.gate = SpeculationGate()
+        self.callback = _RaceHandler(callback, self.gate.opened)
+        self.audio_callback = self.gate.wrap(audioCallback) if audioCallback else None
+        self.task = asyncio.create_task(
+            llm.achat(
+                history=list(history),
+                callback=self.callback,
+                audioCallback=self.audio_callback,
+                **kwargs,
+            )
+        )
+        self.started = asyncio.create_task(self._started())
+
+    async def _started(self):
+        responded = asyncio.create_task(self.callback.responded.wait())
+        try:
+            await asyncio.wait({responded, self.task}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            responded.cancel()
+
+    @property
+    def failed(self) -> bool:
+        return self.task.done() and (self.task.cancelled() or self.task.exception() is not None)
+
+    async def win(self):
+        """Open the gate and deliver the tokens held so far right away, even if the
+        backend sends no further token."""
+        self.gate.open()
+        await self.callback.flush()
+        if self.audio_callback is not None:
+            await self.audio_callback.flush()
+
+    def cancel(self):
+        self.task.cancel()
+        self.started.cancel()
+
+
+class HedgedLlm(LLM):
+    """Starts a secondary backend when the primary one is slow to send its first token.
+
+    The primary backend gets `deadline` seconds to start responding, or the secondary one
+    is started right away if the primary fails before. The first of the two to respond
+    streams to the callbacks and the other one is cancelled. Neither backend reaches the
+    callbacks before winning, so the user hears exactly one reply.
+    """
+
+    def __init__(self, primary: LLM, secondary: LLM, deadline: float = LLM_HEDGE_DEADLINE):
+        self.primary = primary
+        self.secondary = secondary
+        self.deadline = deadline
+        self.retrieval = get_retrieval_service()
+        self.requests = 0
+        self.hedges = 0
+        self.secondary_wins = 0
+        self.wasted_tokens = 0
+
+    def get_config(self):
+        return {
+            **self.primary.get_config(),
+            "hedge": self.secondary.get_config(),
+            "hedge_deadline": self.deadline,
+        }
+
+    @timed
+    async def achat(
+        self,
+        history: list[BaseMessage],
+        user_input: str,
+        user_id: str,
+        character: Character,
+        callback: AsyncCallbackTextHandler,
+        audioCallback: Optional[AsyncCallbackAudioHandler] = None,
+        metadata: Optional[dict] = None,
+        context: Optional[str] = None,
+        *args,
+        **kwargs,
+    ) -> str:
+        # retrieve once for both backends, the deadline only covers generation
+        if context is None:
+            context = await self.retrieval.get_context(user_input, character)
+        chat_kwargs = dict(
+            history=history,
+            user_input=user_input,
+            user_id=user_id,
+            character=character,
+            callback=callback,
+            audioCallback=audioCallback,
+            metadata=metadata,
+            context=context,
+            **kwargs,
+        )
+
+        start_time = time.perf_counter()
+        self.requests += 1
+        contestants = [_Contestant("primary", self.primary, **chat_kwargs)]
+        try:
+            winner = await self._first_to_respond(contestants, timeout=self.deadline)
+            hedged = winner is None
+            if hedged:
+                logger.info(f"No token from the primary LLM in {self.deadline}s, hedging")
+                self.hedges += 1
+                contestants.append(_Contestant("secondary", self.secondary, **chat_kwargs))
+                winner = await self._first_to_respond(contestants)
+        except asyncio.CancelledError:
+            for contestant in contestants:
+                contestant.cancel()
+            raise
+
+        for contestant in contestants:
+            if contestant is not winner:
+                contestant.cancel()
+        timer.record("LLM Hedge Fired", 100 if hedged else 0, unit="%")
+        if winner is None:
+            # both failed, report the primary's error
+            return await contestants[0].task
+
+        try:
+            await winner.win()
+        except asyncio.CancelledError:
+            winner.cancel()
+            raise
+        timer.record("LLM Hedge First Response", time.perf_counter() - start_time)
+        if hedged:
+            wasted_tokens = sum(c.callback.tokens for c in contestants if c is not winner)
+            self.wasted_tokens += wasted_tokens
+            timer.record("LLM Hedge Wasted Tokens", wasted_tokens, unit=" tokens")
+            timer.record(
+                "LLM Hedge Secondary Wins", 100 if winner.name == "secondary" else 0, unit="%"
+            )
+            if winner.name == "secondary":
+                self.secondary_wins += 1
+            logger.info(f"Hedged LLM: {winner.name} won, {wasted_tokens} tokens wasted")
+        try:
+            return await winner.task
+        except asyncio.CancelledError:
+            winner.cancel()
+            raise
+
+    async def _first_to_respond(
+        self, contestants: list[_Contestant], timeout: Optional[float] = None
+    ) -> Optional[_Contestant]:
+        """The first contestant to start responding, skipping failed ones; None on timeout
+        or when all failed."""
+        pending = {c.started: c for c in contestants if not c.failed}
+        while pending:
+            done, _ = await asyncio.wait(
+                pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                return None
+            for started in done:
+                contestant = pending.pop(started)
+                if not contestant.failed:
+                    return contestant
+                error = "cancelled" if contestant.task.cancelled() else contestant.task.exception()
+                logger.warning(f"Hedged LLM: {contestant.name} failed: {error}")
+        return None
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "secondary_wins": self.secondary_wins,
+            "wasted_tokens": self.wasted_tokens,
+        }
@@ -1,5 +1,26 @@
 # flake8: noqa
-from realtime_ai_character.llm.openai_llm import OpenaiLlm
+import asyncio
+import hashlib
+import os
+import re
+import threading
+from typing import AsyncIterator, Optional
+
+from cachetools import LRUCache
+
+from realtime_ai_character.llm import get_chat_model
+from realtime_ai_character.llm.prompt_budget import count_tokens
+from realtime_ai_character.logger import get_logger
+
+
+logger = get_logger(__name__)
+
+HIGHLIGHT_MODEL = os.getenv("HIGHLIGHT_MODEL", "gpt-4o")
+# journals longer than this are summarized in chunks of this size first
+HIGHLIGHT_CHUNK_TOKENS = int(os.getenv("HIGHLIGHT_CHUNK_TOKENS", "2000"))
+# chunk summaries requested at the same time by one call
+HIGHLIGHT_CONCURRENCY = int(os.getenv("HIGHLIGHT_CONCURRENCY", "4"))
+HIGHLIGHT_CACHE_SIZE = int(os.getenv("HIGHLIGHT_CACHE_SIZE", "4096"))
 
 prompt_to_generate_highlight = """
 Based on the following meeting transcription, create a concise list of highlight bullet points that should be based on the specific content of the meeting and specific action items.
@@ -12,13 +33,6 @@ When you reply, you must prefix the bullet points with -, one bullet point each
 If you found that there are no bullet points meaningful in the given context, reply with a space directly.
 """
 
-
-async def generate_highlight_action(journal_text):
-    chat_model = OpenaiLlm(model="gpt-4o").chat_open_ai
-    prompt = prompt_to_generate_highlight.format(journal_text=journal_text)
-    return await chat_model.apredict(prompt)
-
-
 prompt_to_generate_highlight_based_on_prompt = """
 Ignore all your previous instructions
 You are the meeting's assistant, you have received a full transcript of the meeting, and someone in the meeting is talking to you with a request.
@@ -36,10 +50,132 @@ When you reply, if the user starts a conversation, forget about highlights and t
 
 """
 
+prompt_to_summarize_chunk = """
+The following is part {part} of a meeting transcription.
+Write concise notes of this part: keep every specific fact, decision, number, name and action item, drop small talk.
 
-async def generate_highlight_based_on_prompt(journal_text, prompt_text):
-    chat_model = OpenaiLlm(model="gpt-4o").chat_open_ai
-    prompt = prompt_to_generate_highlight_based_on_prompt.format(
-        journal_text=journal_text, prompt_text=prompt_text
+{chunk}
+---
+Reply directly with the notes, nothing more.
+"""
+
+_SENTENCE_END = re.compile(r"(?<=[.!?。？！])\s+|\n+")
+
+# chunk summaries by hash of the chunk text, shared by all journals
+_summaries: LRUCache = LRUCache(maxsize=HIGHLIGHT_CACHE_SIZE)
+_summaries_lock = threading.Lock()
+
+
+def _split_sentence(sentence: str, max_tokens: int) -> list[str]:
+    """Cut a sentence longer than `max_tokens` into pieces of at most `max_tokens`, between
+    words where it has spaces."""
+    pieces = []
+    parts = -(-count_tokens(sentence) // max_tokens)
+    size = -(-len(sentence) // parts)
+    start = 0
+    while start < len(sentence):
+        end = min(start + size, len(sentence))
+        if end < len(sentence):
+            space = sentence.rfind(" ", start + 1, end)
+            if space > start:
+                end = space
+        piece = sentence[start:end].strip()
+        start = end
+        if not piece:
+            continue
+        # tokens are not spread evenly over the characters
+        if len(piece) > 1 and count_tokens(piece) > max_tokens:
+            pieces += _split_sentence(piece, max_tokens)
+        else:
+            pieces.append(piece)
+    return pieces
+
+
+def split_journal(journal_text: str, chunk_tokens: int = HIGHLIGHT_CHUNK_TOKENS) -> list[str]:
+    """Split a journal into chunks of whole sentences of at most `chunk_tokens`.
+
+    Chunks are filled from the start, so when the journal grows only its last chunk
+    changes and new ones are added. A sentence longer than a chunk is cut into pieces.
+    """
+    chunks = []
+    sentences: list[str] = []
+    tokens = 0
+    for sentence in _SENTENCE_END.split(journal_text):
+        if not sentence.strip():
+            continue
+        sentence_tokens = count_tokens(sentence)
+        if sentence_tokens > chunk_tokens:
+            pieces = [
+                (piece, count_tokens(piece)) for piece in _split_sentence(sentence, chunk_tokens)
+            ]
+        else:
+            pieces = [(sentence, sentence_tokens)]
+        for piece, piece_tokens in pieces:
+            if sentences and tokens + piece_tokens > chunk_tokens:
+                chunks.append(" ".join(sentences))
+                sentences, tokens = [], 0
+            sentences.append(piece)
+            tokens += piece_tokens
+    if sentences:
+        chunks.append(" ".join(sentences))
+    return chunks
+
+
+async def _summarize_chunk(chunk: str, part: int, semaphore: asyncio.Semaphore) -> str:
+    key = hashlib.sha256(chunk.encode()).hexdigest()
+    with _summaries_lock:
+        summary = _summaries.get(key)
+    if summary is not None:
+        return summary
+    try:
+        async with semaphore:
+            summary = await get_chat_model(HIGHLIGHT_MODEL).apredict(
+                prompt_to_summarize_chunk.format(part=part, chunk=chunk)
+            )
+    except Exception as e:
+        # one failed part should not fail the whole highlight
+        logger.warning(f"Failed to summarize part {part} of the journal, using it as is: {e}")
+        return chunk
+    with _summaries_lock:
+        _summaries[key] = summary
+    return summary
+
+
+async def condense_journal(journal_text: str) -> str:
+    """The journal itself if it fits one chunk, otherwise the notes of its chunks.
+
+    Chunks are summarized concurrently, at most HIGHLIGHT_CONCURRENCY at a time, and
+    their notes are cached by content, so repeated calls on a growing journal only
+    summarize the new part. A chunk whose summary fails is used as is.
+    """
+    chunks = split_journal(journal_text)
+    if len(chunks) <= 1:
+        return journal_text
+    semaphore = asyncio.Semaphore(HIGHLIGHT_CONCURRENCY)
+    summaries = await asyncio.gather(
+        *[_summarize_chunk(chunk, i + 1, semaphore) for i, chunk in enumerate(chunks)]
     )
-    return await chat_model.apredict(prompt)
+    logger.info(f"Condensed journal of {len(chunks)} chunks")
+    return "\n\n".join(summaries)
+
+
+async def stream_highlight(
+    journal_text: str, prompt_text: Optional[str] = None
+) -> AsyncIterator[str]:
+    journal_text = await condense_journal(journal_text)
+    if prompt_text:
+        prompt = prompt_to_generate_highlight_based_on_prompt.format(
+            journal_text=journal_text, prompt_text=prompt_text
+        )
+    else:
+        prompt = prompt_to_generate_highlight.format(journal_text=journal_text)
+    async for chunk in get_chat_model(HIGHLIGHT_MODEL).astream(prompt):
+        yield chunk.content
+
+
+async def generate_highlight_action(journal_text):
+    return "".join([token async for token in stream_highlight(journal_text)])
+
+
+async def generate_highlight_based_on_prompt(journal_text, prompt_text):
+    return "".join([token async for token in stream_highlight(journal_text, prompt_text)])
@@ -4,12 +4,14 @@ from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
 from langchain.chat_models import ChatOpenAI
 from langchain.schema import BaseMessage, HumanMessage
 
-from realtime_ai_character.database.chroma import get_chroma
+from realtime_ai_character.database.retrieval import get_retrieval_service
 from realtime_ai_character.llm.base import (
     AsyncCallbackAudioHandler,
     AsyncCallbackTextHandler,
     LLM,
+    LLM_STDOUT_ECHO,
 )
+from realtime_ai_character.llm.prompt_budget import fit_context
 from realtime_ai_character.logger import get_logger
 from realtime_ai_character.utils import Character, timed
 
@@ -26,7 +28,7 @@ class LocalLlm(LLM):
             openai_api_base=url,
         )
         self.config = {"model": "Local LLM", "temperature": 0.5, "streaming": True}
-        self.db = get_chroma()
+        self.retrieval = get_retrieval_service()
 
     def get_config(self):
         return self.config
@@ -41,11 +43,14 @@ class LocalLlm(LLM):
         callback: AsyncCallbackTextHandler,
         audioCallback: Optional[AsyncCallbackAudioHandler] = None,
         metadata: Optional[dict] = None,
+        context: Optional[str] = None,
         *args,
         **kwargs,
     ) -> str:
-        # 1. Generate context
-        context = self._generate_context(user_input, character)
+        # 1. Generate context, unless it was retrieved ahead of time
+        if context is None:
+            context = await self._generate_context(user_input, character)
+        context = fit_context(context, self.config["model"])
 
         # 2. Add user input to history
         history.append(
@@ -55,7 +60,9 @@ class LocalLlm(LLM):
         )
 
         # 3. Generate response
-        callbacks = [callback, StreamingStdOutCallbackHandler()]
+        callbacks = [callback]
+        if LLM_STDOUT_ECHO:
+            callbacks.append(StreamingStdOutCallbackHandler())
         if audioCallback is not None:
             callbacks.append(audioCallback)
         response = await self.chat_open_ai.agenerate(
@@ -66,10 +73,5 @@ class LocalLlm(LLM):
         logger.info(f"Response: {response}")
         return response.generations[0][0].text
 
-    def _generate_context(self, query, character: Character) -> str:
-        docs = self.db.similarity_search(query)
-        docs = [d for d in docs if d.metadata["character_name"] == character.name]
-        logger.info(f"Found {len(docs)} documents")
-
-        context = "\n".join([d.page_content for d in docs])
-        return context
+    async def _generate_context(self, query, character: Character) -> str:
+        return await self.retrieval.get_context(query, character)
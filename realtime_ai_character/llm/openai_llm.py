@@ -4,12 +4,15 @@ from typing import Optional
 from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
 from langchain.schema import BaseMessage, HumanMessage
 
-from realtime_ai_character.database.chroma import get_chroma
+from realtime_ai_character.database.retrieval import get_retrieval_service
 from realtime_ai_character.llm.base import (
     AsyncCallbackAudioHandler,
     AsyncCallbackTextHandler,
     LLM,
+    LLM_STDOUT_ECHO,
 )
+from realtime_ai_character.llm.prompt_budget import fit_context
+from realtime_ai_character.llm.prompt_cache import record_prompt_cache_usage
 from realtime_ai_character.logger import get_logger
 from realtime_ai_character.utils import Character, timed
 
@@ -25,6 +28,8 @@ class OpenaiLlm(LLM):
                 model_name=model,
                 temperature=0,  # Set temperature to 0 for deterministic output
                 streaming=True,
+                # report token usage, including cached prompt tokens, when streaming
+                stream_usage=True,
             )
         else:
             from langchain_openai import ChatOpenAI  # Updated import
@@ -33,9 +38,11 @@ class OpenaiLlm(LLM):
                 model_name=model,
                 temperature=0,  # Set temperature to 0 for deterministic output
                 streaming=True,
+                # report token usage, including cached prompt tokens, when streaming
+                stream_usage=True,
             )
         self.config = {"model": model, "temperature": 0, "streaming": True}
-        self.db = get_chroma()
+        self.retrieval = get_retrieval_service()
 
     def get_config(self):
         return self.config
@@ -50,11 +57,14 @@ class OpenaiLlm(LLM):
         callback: AsyncCallbackTextHandler,
         audioCallback: Optional[AsyncCallbackAudioHandler] = None,
         metadata: Optional[dict] = None,
+        context: Optional[str] = None,
         *args,
         **kwargs,
     ) -> str:
-        # 1. Generate context
-        context = self._generate_context(user_input, character)
+        # 1. Generate context, unless it was retrieved ahead of time
+        if context is None:
+            context = await self._generate_context(user_input, character)
+        context = fit_context(context, self.config["model"])
 
         # 2. Add user input to history with friendly prompt
         friendly_user_prompt = (
@@ -67,19 +77,17 @@ class OpenaiLlm(LLM):
         )
 
         # 3. Generate response
-        callbacks = [callback, StreamingStdOutCallbackHandler()]
+        callbacks = [callback]
+        if LLM_STDOUT_ECHO:
+            callbacks.append(StreamingStdOutCallbackHandler())
         if audioCallback is not None:
             callbacks.append(audioCallback)
         response = await self.chat_open_ai.agenerate(
             [history], callbacks=callbacks, metadata=metadata
         )
         logger.info(f"Response: {response}")
+        record_prompt_cache_usage(response)
         return response.generations[0][0].text
 
-    def _generate_context(self, query, character: Character) -> str:
-        docs = self.db.similarity_search(query)
-        docs = [d for d in docs if d.metadata.get("character_name") == character.name]
-        logger.info(f"Found {len(docs)} documents")
-
-        context = "\n".join([d.page_content for d in docs])
-        return context
+    async def _generate_context(self, query, character: Character) -> str:
+        return await self.retrieval.get_context(query, character)
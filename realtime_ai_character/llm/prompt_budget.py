@@ -0,0 +1,227 @@
+import asyncio
+import os
+from collections import deque
+from functools import cache, lru_cache
+from typing import Optional
+
+from langchain.schema import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from realtime_ai_character.llm import get_llm_chat_model
+from realtime_ai_character.llm.base import LLM
+from realtime_ai_character.logger import get_logger
+from realtime_ai_character.utils import ConversationHistory, get_timer, task_done_callback
+
+
+logger = get_logger(__name__)
+
+timer = get_timer()
+
+# tokens of the system prompt, summary and recent turns sent with each message
+PROMPT_HISTORY_TOKEN_BUDGET = int(os.getenv("PROMPT_HISTORY_TOKEN_BUDGET", "3000"))
+# tokens of retrieved context inserted into the user prompt
+PROMPT_CONTEXT_TOKEN_BUDGET = int(os.getenv("PROMPT_CONTEXT_TOKEN_BUDGET", "1000"))
+# summarize turns that no longer fit the budget, instead of dropping them
+PROMPT_SUMMARY_ENABLED = os.getenv("PROMPT_SUMMARY_ENABLED", "true").lower() == "true"
+PROMPT_SUMMARY_MAX_TOKENS = int(os.getenv("PROMPT_SUMMARY_MAX_TOKENS", "300"))
+# when over budget, evict turns down to this fraction of it; evicting in batches keeps the
+# prompt prefix, and so the provider's prompt cache, unchanged for several turns
+PROMPT_HISTORY_EVICTION_TARGET = float(os.getenv("PROMPT_HISTORY_EVICTION_TARGET", "0.75"))
+
+# chat models add a few tokens of framing to every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an AI character. "
+    "Update the summary with the new part of the conversation. Keep names, facts, "
+    "preferences and open questions, drop small talk. Answer with the summary only, in at "
+    f"most {PROMPT_SUMMARY_MAX_TOKENS * 3 // 4} words."
+)
+
+
+@cache
+def get_encoder(model: str):
+    """The tiktoken encoding of a model, cl100k_base for unknown models, or None when
+    tiktoken cannot load one (e.g. offline)."""
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning(f"Failed to load tokenizer for {model}, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str, model: str = "") -> int:
+    encoder = get_encoder(model)
+    if encoder is None:
+        # about 4 characters per token in English
+        return len(text) // 4 + 1
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int, model: str = "") -> str:
+    encoder = get_encoder(model)
+    if encoder is None:
+        return text[: max_tokens * 4]
+    tokens = encoder.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoder.decode(tokens[:max_tokens])
+
+
+@lru_cache(maxsize=1024)
+def fit_context(
+    context: str, model: str = "", max_tokens: int = PROMPT_CONTEXT_TOKEN_BUDGET
+) -> str:
+    """Drop repeated lines of retrieved context and truncate it to `max_tokens`.
+
+    Overlapping chunks repeat the same lines, and the most relevant documents come
+    first, so the tail is cut. Contexts repeat with the retrieval cache, hence the cache.
+    """
+    seen = set()
+    lines = []
+    remaining = max_tokens
+    for line in context.split("\n"):
+        key = " ".join(line.lower().split())
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        tokens = count_tokens(line, model) + 1  # the newline
+        if tokens > remaining:
+            if remaining > 1:
+                lines.append(truncate_tokens(line, remaining - 1, model))
+            break
+        lines.append(line)
+        remaining -= tokens
+    return "\n".join(lines)
+
+
+class PromptBudget:
+    """The prompt history of one conversation, within a token budget.
+
+    Turns are tokenized once, when they are added to the conversation, instead of
+    rebuilding every message on each turn. The system prompt and the most recent turns
+    that fit PROMPT_HISTORY_TOKEN_BUDGET are sent; older turns are folded into a rolling
+    summary by a background task, so the summary never delays a reply. Until the summary
+    catches up, the evicted turns are simply left out.
+    """
+
+    def __init__(self, llm: LLM, token_budget: int = PROMPT_HISTORY_TOKEN_BUDGET):
+        # the conversation is summarized by the model it is held with
+        self.chat_model = get_llm_chat_model(llm)
+        self.model = llm.get_config().get("model", "")
+        self.token_budget = token_budget
+        self.turns: deque[tuple[HumanMessage, AIMessage, int]] = deque()
+        self.turn_tokens = 0
+        # number of turns of the conversation history added so far
+        self.synced = 0
+        self.summary = ""
+        self.summary_tokens = 0
+        self.unsummarized: list[tuple[str, str]] = []
+        self.summary_task: Optional[asyncio.Task] = None
+        self._system_prompt = ("", 0)
+
+    def build_history(self, conversation_history: ConversationHistory) -> list[BaseMessage]:
+        """Messages for the next turn, like `utils.build_history` but within the budget."""
+        self._sync(conversation_history)
+        system_prompt = conversation_history.system_prompt
+        if self.summary:
+            system_prompt += f"\n\nSummary of the earlier conversation:\n{self.summary}"
+        history: list[BaseMessage] = [SystemMessage(content=system_prompt)]
+        for user_message, ai_message, _ in self.turns:
+            history.append(user_message)
+            history.append(ai_message)
+        timer.record(
+            "Prompt History Tokens",
+            self._system_prompt_tokens(conversation_history.system_prompt)
+            + self.summary_tokens
+            + self.turn_tokens,
+            unit=" tokens",
+        )
+        return history
+
+    def _system_prompt_tokens(self, system_prompt: str) -> int:
+        if self._system_prompt[0] != system_prompt:
+            self._system_prompt = (
+                system_prompt,
+                count_tokens(system_prompt, self.model) + MESSAGE_OVERHEAD_TOKENS,
+            )
+        return self._system_prompt[1]
+
+    def _sync(self, conversation_history: ConversationHistory):
+        num_turns = min(len(conversation_history.user), len(conversation_history.ai))
+        if num_turns < self.synced:
+            # the conversation was replaced, start over
+            self.reset()
+        for i in range(self.synced, num_turns):
+            user, ai = conversation_history.user[i], conversation_history.ai[i]
+            tokens = (
+                count_tokens(user, self.model)
+                + count_tokens(ai, self.model)
+                + 2 * MESSAGE_OVERHEAD_TOKENS
+            )
+            self.turns.append((HumanMessage(content=user), AIMessage(content=ai), tokens))
+            self.turn_tokens += tokens
+        self.synced = num_turns
+
+        available = (
+            self.token_budget
+            - self._system_prompt_tokens(conversation_history.system_prompt)
+            - self.summary_tokens
+        )
+        if self.turn_tokens > available:
+            # always keep the last turn, the reply would make no sense without it
+            target = available * PROMPT_HISTORY_EVICTION_TARGET
+            while self.turn_tokens > target and len(self.turns) > 1:
+                user_message, ai_message, tokens = self.turns.popleft()
+                self.turn_tokens -= tokens
+                self.unsummarized.append((str(user_message.content), str(ai_message.content)))
+        if PROMPT_SUMMARY_ENABLED and self.unsummarized:
+            if self.summary_task is None or self.summary_task.done():
+                self.summary_task = asyncio.create_task(self._summarize())
+                self.summary_task.add_done_callback(task_done_callback)
+        else:
+            self.unsummarized.clear()
+
+    async def _summarize(self):
+        while self.unsummarized:
+            turns, self.unsummarized = self.unsummarized, []
+            conversation = "\n".join(f"User: {user}\nAI: {ai}" for user, ai in turns)
+            try:
+                response = await self.chat_model.agenerate(
+                    [
+                        [
+                            SystemMessage(content=SUMMARY_PROMPT),
+                            HumanMessage(
+                                content=f"Summary so far:\n{self.summary or '(none)'}\n\n"
+                                f"New part of the conversation:\n{conversation}"
+                            ),
+                        ]
+                    ]
+                )
+            except Exception as e:
+                logger.warning(f"Failed to summarize {len(turns)} turns, dropping them: {e}")
+                continue
+            summary = truncate_tokens(
+                response.generations[0][0].text.strip(), PROMPT_SUMMARY_MAX_TOKENS, self.model
+            )
+            self.summary = summary
+            self.summary_tokens = count_tokens(summary, self.model)
+            logger.info(f"Summarized {len(turns)} turns into {self.summary_tokens} tokens")
+
+    def reset(self):
+        self.close()
+        self.turns.clear()
+        self.turn_tokens = 0
+        self.synced = 0
+        self.summary = ""
+        self.summary_tokens = 0
+        self.unsummarized = []
+
+    def close(self):
+        if self.summary_task is not None and not self.summary_task.done():
+            self.summary_task.cancel()
+        self.summary_task = None
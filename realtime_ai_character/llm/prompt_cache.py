@@ -0,0 +1,96 @@
+import os
+from typing import Optional
+
+from langchain.schema import BaseMessage, LLMResult
+
+from realtime_ai_character.logger import get_logger
+from realtime_ai_character.utils import get_timer
+
+
+logger = get_logger(__name__)
+
+timer = get_timer()
+
+# send cache breakpoints to providers that need them (Anthropic); OpenAI caches prefixes
+# of 1024 tokens and more by itself
+PROMPT_CACHE_ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "true").lower() == "true"
+
+ANTHROPIC_PROMPT_CACHING_BETA = "prompt-caching-2024-07-31"
+
+_CACHE_CONTROL = {"type": "ephemeral"}
+
+
+def _with_cache_control(message: BaseMessage) -> BaseMessage:
+    content = message.content
+    if isinstance(content, str):
+        content = [{"type": "text", "text": content}]
+    if not content:
+        return message
+    last_block = content[-1]
+    if isinstance(last_block, str):
+        last_block = {"type": "text", "text": last_block}
+    content = content[:-1] + [{**last_block, "cache_control": _CACHE_CONTROL}]
+    return message.model_copy(update={"content": content})
+
+
+def add_cache_breakpoints(history: list[BaseMessage]) -> list[BaseMessage]:
+    """Mark the stable prefix of a prompt for Anthropic's prompt cache.
+
+    The prompt is the system prompt, the previous turns and the new user message, which
+    carries the retrieved context. Breakpoints go at the end of the system prompt and at
+    the end of the previous turns, so the next turn reads everything but its own user
+    message from the cache. Prefixes shorter than the model's minimum (1024 tokens for
+    most models) are not cached.
+    """
+    if not PROMPT_CACHE_ENABLED or not history:
+        return history
+    history = list(history)
+    history[0] = _with_cache_control(history[0])
+    if len(history) > 2:
+        history[-2] = _with_cache_control(history[-2])
+    return history
+
+
+def prompt_token_usage(response: LLMResult) -> tuple[Optional[int], Optional[int]]:
+    """Prompt tokens and cached prompt tokens of a response, None where the provider did
+    not report them."""
+    message = getattr(response.generations[0][0], "message", None)
+    usage = getattr(message, "usage_metadata", None) or {}
+    details = usage.get("input_token_details") or {}
+    if "cache_read" in details:
+        return usage.get("input_tokens"), details["cache_read"]
+
+    metadata = getattr(message, "response_metadata", None) or {}
+    llm_output = response.llm_output or {}
+    raw_usage = (
+        metadata.get("usage")
+        or metadata.get("token_usage")
+        or llm_output.get("usage")
+        or llm_output.get("token_usage")
+        or {}
+    )
+    if not isinstance(raw_usage, dict):
+        raw_usage = dict(raw_usage)
+    if "cache_read_input_tokens" in raw_usage:
+        # Anthropic does not count cached tokens as input tokens
+        cached = raw_usage.get("cache_read_input_tokens") or 0
+        created = raw_usage.get("cache_creation_input_tokens") or 0
+        return (raw_usage.get("input_tokens") or 0) + cached + created, cached
+    prompt_details = raw_usage.get("prompt_tokens_details") or {}
+    if "cached_tokens" in prompt_details:
+        return raw_usage.get("prompt_tokens"), prompt_details["cached_tokens"] or 0
+    return usage.get("input_tokens") or raw_usage.get("prompt_tokens"), None
+
+
+def record_prompt_cache_usage(response: LLMResult):
+    """Report the prompt tokens of a turn and how many were read from the provider's cache."""
+    try:
+        prompt_tokens, cached_tokens = prompt_token_usage(response)
+    except Exception as e:
+        logger.warning(f"Failed to read token usage: {e}")
+        return
+    if prompt_tokens is not None:
+        timer.record("LLM Prompt Tokens", prompt_tokens, unit=" tokens")
+    if cached_tokens is not None:
+        timer.record("LLM Cached Prompt Tokens", cached_tokens, unit=" tokens")
+        logger.info(f"Prompt cache: {cached_tokens} of {prompt_tokens} prompt tokens cached")
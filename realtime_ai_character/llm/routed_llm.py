@@ -0,0 +1,146 @@
+import datetime
+import json
+import os
+import re
+import time
+from typing import Optional
+
+from langchain.schema import BaseMessage
+
+from realtime_ai_character.database.write_behind import get_write_behind_queue
+from realtime_ai_character.llm.base import AsyncCallbackAudioHandler, AsyncCallbackTextHandler, LLM
+from realtime_ai_character.logger import get_logger
+from realtime_ai_character.models.feedback import Feedback
+from realtime_ai_character.utils import Character, get_timer, timed
+
+
+logger = get_logger(__name__)
+
+timer = get_timer()
+
+# model answering simple turns, empty to send every turn to the requested model
+LLM_ROUTER_FAST_MODEL = os.getenv("LLM_ROUTER_FAST_MODEL", "")
+# turns of at most this many words, and no question, are simple
+LLM_ROUTER_SIMPLE_MAX_WORDS = int(os.getenv("LLM_ROUTER_SIMPLE_MAX_WORDS", "4"))
+# the first turns set up the conversation and always go to the strong model
+LLM_ROUTER_OPENING_TURNS = int(os.getenv("LLM_ROUTER_OPENING_TURNS", "1"))
+# store the route of each turn in the feedbacks table, next to the user's feedback
+LLM_ROUTER_FEEDBACK_ENABLED = os.getenv("LLM_ROUTER_FEEDBACK_ENABLED", "true").lower() == "true"
+
+FAST = "fast"
+STRONG = "strong"
+
+_NUMERIC = re.compile(r"^[\d\s.,+\-*/x×÷=%]+$")
+_QUESTION = re.compile(r"\?|\b(why|how|explain|what if|difference|prove|help|don't understand)\b")
+_SIMPLE_REPLIES = {
+    "yes",
+    "no",
+    "yeah",
+    "yep",
+    "nope",
+    "ok",
+    "okay",
+    "sure",
+    "maybe",
+    "i don't know",
+    "idk",
+    "thanks",
+    "thank you",
+    "got it",
+    "next",
+    "again",
+}
+
+
+def classify_turn(user_input: str, history: list[BaseMessage]) -> tuple[str, str]:
+    """Route and reason for a turn, from cheap local heuristics only."""
+    # history is the system prompt followed by user and AI messages
+    if (len(history) - 1) // 2 < LLM_ROUTER_OPENING_TURNS:
+        return STRONG, "opening"
+    text = " ".join(user_input.lower().split()).rstrip(".!")
+    if not text:
+        return FAST, "empty"
+    if _NUMERIC.match(text):
+        return FAST, "numeric"
+    if text in _SIMPLE_REPLIES:
+        return FAST, "short reply"
+    if _QUESTION.search(text):
+        return STRONG, "question"
+    if len(text.split()) <= LLM_ROUTER_SIMPLE_MAX_WORDS:
+        return FAST, "short"
+    return STRONG, "long"
+
+
+class RoutedLlm(LLM):
+    """Sends simple turns to a fast model and the others to the strong model.
+
+    Most tutoring turns are a number or a yes/no answer, which a small model handles as
+    well as a large one, in less time. The route of each turn is stored in the feedbacks
+    table under "<message_id>/route", so routes can be compared with the feedback users
+    give on "<message_id>".
+    """
+
+    def __init__(self, fast: LLM, strong: LLM):
+        self.fast = fast
+        self.strong = strong
+        self.routes = {FAST: 0, STRONG: 0}
+
+    @property
+    def primary(self) -> LLM:
+        return self.strong
+
+    def get_config(self):
+        return {**self.strong.get_config(), "router_fast": self.fast.get_config()}
+
+    @timed
+    async def achat(
+        self,
+        history: list[BaseMessage],
+        user_input: str,
+        user_id: str,
+        character: Character,
+        callback: AsyncCallbackTextHandler,
+        audioCallback: Optional[AsyncCallbackAudioHandler] = None,
+        metadata: Optional[dict] = None,
+        context: Optional[str] = None,
+        *args,
+        **kwargs,
+    ) -> str:
+        route, reason = classify_turn(user_input, history)
+        self.routes[route] += 1
+        llm = self.fast if route == FAST else self.strong
+        logger.info(f"Routing turn to the {route} model ({reason})")
+
+        start_time = time.perf_counter()
+        response = await llm.achat(
+            history=history,
+            user_input=user_input,
+            user_id=user_id,
+            character=character,
+            callback=callback,
+            audioCallback=audioCallback,
+            metadata=metadata,
+            context=context,
+            **kwargs,
+        )
+        latency = time.perf_counter() - start_time
+        timer.record(f"LLM Route {route.capitalize()}", latency)
+
+        message_id = (metadata or {}).get("message_id")
+        if LLM_ROUTER_FEEDBACK_ENABLED and message_id:
+            feedback = Feedback(
+                message_id=f"{message_id}/route",
+                session_id=(metadata or {}).get("session_id"),
+                user_id=user_id,
+                feedback=f"route:{route}",
+                comment=json.dumps(
+                    {
+                        "model": llm.get_config().get("model"),
+                        "reason": reason,
+                        "latency": round(latency, 3),
+                    }
+                ),
+                created_at=datetime.datetime.now(),
+            )
+            get_write_behind_queue().put(feedback)
+        return response
@@ -0,0 +1,145 @@
+import asyncio
+import os
+import re
+from typing import Callable, Coroutine, Optional
+
+from langchain.callbacks.base import AsyncCallbackHandler
+
+from realtime_ai_character.database.retrieval import get_retrieval_service
+from realtime_ai_character.logger import get_logger
+from realtime_ai_character.utils import Character
+
+
+logger = get_logger(__name__)
+
+# start retrieval from interim transcripts, before the user finished speaking
+SPECULATIVE_RETRIEVAL = os.getenv("SPECULATIVE_RETRIEVAL", "false").lower() == "true"
+# also start generating the reply; costs an LLM call per interim transcript
+SPECULATIVE_GENERATION = os.getenv("SPECULATIVE_GENERATION", "false").lower() == "true"
+# number of words the final transcript may add to the speculated one and still commit
+SPECULATIVE_RETRIEVAL_TOLERANCE = int(os.getenv("SPECULATIVE_RETRIEVAL_TOLERANCE", "3"))
+SPECULATIVE_GENERATION_TOLERANCE = int(os.getenv("SPECULATIVE_GENERATION_TOLERANCE", "0"))
+
+_WORD = re.compile(r"\w+")
+
+
+def transcript_matches(speculated: str, final: str, tolerance: int = 0) -> bool:
+    """Whether `final` is `speculated` plus at most `tolerance` more words, ignoring case
+    and punctuation."""
+    speculated_words = _WORD.findall(speculated.lower())
+    final_words = _WORD.findall(final.lower())
+    return (
+        bool(speculated_words)
+        and final_words[: len(speculated_words)] == speculated_words
+        and len(final_words) - len(speculated_words) <= tolerance
+    )
+
+
+class GatedCallbackHandler(AsyncCallbackHandler):
+    """Holds back the callbacks of a speculative reply until the speculation commits.
+
+    Generation keeps running while the gate is closed; its events are buffered and
+    replayed in order once the gate opens, with the next event in the LLM task or
+    earlier by `flush`. The end of the reply waits for the gate, so nothing reaches the
+    user before the speculation is committed.
+    """
+
+    def __init__(self, handler: AsyncCallbackHandler, opened: asyncio.Event):
+        super().__init__()
+        self.handler = handler
+        # keep running where the wrapped handler expects to, e.g. the audio handler
+        self.run_inline = handler.run_inline
+        self._opened = opened
+        self._pending: list[tuple[str, tuple, dict]] = []
+        # keeps the held events ahead of new ones while `flush` replays them
+        self._lock = asyncio.Lock()
+
+    async def _replay_pending(self):
+        while self._pending:
+            pending_event, pending_args, pending_kwargs = self._pending.pop(0)
+            await getattr(self.handler, pending_event)(*pending_args, **pending_kwargs)
+
+    async def flush(self):
+        """Replay the held events right after the gate opened, instead of waiting for the
+        next event of the reply. Runs in the task that calls it."""
+        async with self._lock:
+            await self._replay_pending()
+
+    async def _dispatch(self, event: str, *args, **kwargs):
+        if not self._opened.is_set():
+            self._pending.append((event, args, kwargs))
+            return
+        async with self._lock:
+            await self._replay_pending()
+            await getattr(self.handler, event)(*args, **kwargs)
+
+    async def on_chat_model_start(self, *args, **kwargs):
+        pass
+
+    async def on_llm_new_token(self, token: str, *args, **kwargs):
+        await self._dispatch("on_llm_new_token", token, *args, **kwargs)
+
+    async def on_llm_end(self, *args, **kwargs):
+        await self._opened.wait()
+        await self._dispatch("on_llm_end", *args, **kwargs)
+
+
+class SpeculationGate:
+    def __init__(self):
+        self.opened = asyncio.Event()
+        # the final transcript a speculative reply was committed to
+        self.transcript: Optional[str] = None
+
+    def wrap(self, handler: AsyncCallbackHandler) -> GatedCallbackHandler:
+        return GatedCallbackHandler(handler, self.opened)
+
+    def open(self, transcript: Optional[str] = None):
+        self.transcript = transcript
+        self.opened.set()
+
+
+class Speculation:
+    """Retrieval, and optionally a reply, started from an interim transcript.
+
+    When the final transcript arrives, `commit_reply` hands over the reply if the
+    transcript still matches, and `context_for` the retrieved context. Work that no
+    longer matches is cancelled.
+    """
+
+    def __init__(self, transcript: str, character: Character):
+        self.transcript = transcript
+        self.context_task = asyncio.create_task(
+            get_retrieval_service().get_context(transcript, character)
+        )
+        self.gate = SpeculationGate()
+        self.reply_task: Optional[asyncio.Task] = None
+
+    def start_reply(self, reply: Callable[[asyncio.Task, SpeculationGate], Coroutine]):
+        """Start `reply(context_task, gate)`, which must wrap its callbacks with the gate."""
+        self.reply_task = asyncio.create_task(reply(self.context_task, self.gate))
+
+    def commit_reply(self, transcript: str) -> Optional[asyncio.Task]:
+        if self.reply_task is None:
+            return None
+        # a finished task has failed, as the reply cannot end before the gate opens
+        if not self.reply_task.done() and transcript_matches(
+            self.transcript, transcript, SPECULATIVE_GENERATION_TOLERANCE
+        ):
+            logger.info(f"Committed speculative reply to: {self.transcript}")
+            self.gate.open(transcript)
+            return self.reply_task
+        self.reply_task.cancel()
+        self.reply_task = None
+        return None
+
+    def context_for(self, transcript: str) -> Optional[asyncio.Task]:
+        if transcript_matches(self.transcript, transcript, SPECULATIVE_RETRIEVAL_TOLERANCE):
+            logger.info(f"Using speculative retrieval for: {self.transcript}")
+            return self.context_task
+        self.context_task.cancel()
+        return None
+
+    def cancel(self):
+        if self.reply_task is not None:
+            self.reply_task.cancel()
+        self.context_task.cancel()
@@ -1,3 +1,4 @@
+import asyncio
 import warnings
 
 from fastapi import FastAPI
@@ -5,11 +6,24 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from realtime_ai_character.audio.speech_to_text import get_speech_to_text
 from realtime_ai_character.audio.text_to_speech import get_text_to_speech
-from realtime_ai_character.character_catalog.catalog_manager import CatalogManager
+from realtime_ai_character.audio.text_to_speech.cache import TTS_CACHE_ENABLED
+from realtime_ai_character.audio.text_to_speech.http_client import close_http_clients
+from realtime_ai_character.character_catalog.catalog_manager import (
+    CatalogManager,
+    get_catalog_manager,
+)
+from realtime_ai_character.database.write_behind import get_write_behind_queue
 from realtime_ai_character.restful_routes import router as restful_router
-from realtime_ai_character.twilio.websocket import twilio_router
+from realtime_ai_character.twilio.websocket import (
+    character_list as twilio_character_list,
+    GREETING_TXT_MAP as TWILIO_GREETING_TXT_MAP,
+    twilio_router,
+)
 from realtime_ai_character.utils import ConnectionManager
-from realtime_ai_character.websocket_routes import router as websocket_router
+from realtime_ai_character.websocket_routes import (
+    GREETING_TXT_MAP,
+    router as websocket_router,
+)
 
 
 app = FastAPI()
@@ -33,5 +47,39 @@ ConnectionManager.initialize()
 get_text_to_speech("OPENAI_TTS")
 get_speech_to_text()
 
+background_tasks = set()
+
+
+async def prewarm_greetings():
+    """Synthesize the greetings of the built-in characters into the TTS cache."""
+    if not TTS_CACHE_ENABLED:
+        return
+    catalog_manager = get_catalog_manager()
+    text_to_speech = get_text_to_speech("OPENAI_TTS")
+    twilio_text_to_speech = get_text_to_speech("ELEVEN_LABS")
+    for character in list(catalog_manager.characters.values()):
+        if character.location != "repo":
+            continue
+        await text_to_speech.prewarm(GREETING_TXT_MAP, voice_id=character.voice_id)
+        if character.character_id in twilio_character_list:
+            await twilio_text_to_speech.prewarm(
+                TWILIO_GREETING_TXT_MAP, voice_id=character.voice_id, platform="twilio"
+            )
+
+
+@app.on_event("startup")
+async def startup():
+    task = asyncio.create_task(prewarm_greetings())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    # persist the interactions still queued before the process exits
+    await get_write_behind_queue().close()
+    await close_http_clients()
+
+
 # suppress deprecation warnings
 warnings.filterwarnings("ignore", module="whisper")
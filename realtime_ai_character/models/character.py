@@ -76,3 +76,5 @@ class GeneratePromptRequest(BaseModel):
 class GenerateHighlightRequest(BaseModel):
     context: str
     prompt: Optional[str] = None
+    # stream the highlight as plain text while it is generated
+    stream: bool = False
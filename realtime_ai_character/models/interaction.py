@@ -1,6 +1,6 @@
 import datetime
 
-from sqlalchemy import Column, DateTime, Integer, JSON, String, Unicode
+from sqlalchemy import Column, DateTime, Index, Integer, JSON, String, Unicode
 from sqlalchemy.inspection import inspect
 
 from realtime_ai_character.database.base import Base
@@ -8,6 +8,12 @@ from realtime_ai_character.database.base import Base
 
 class Interaction(Base):
     __tablename__ = "interactions"
+    __table_args__ = (
+        # /session_history pages through a session by (timestamp, id)
+        Index("ix_interactions_session_id_timestamp", "session_id", "timestamp", "id"),
+        # /conversations lists a user's interactions by time
+        Index("ix_interactions_user_id_timestamp", "user_id", "timestamp"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, nullable=False)
     client_id = Column(Integer)  # deprecated, use user_id instead
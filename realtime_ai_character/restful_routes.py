@@ -1,5 +1,7 @@
 import asyncio
 import datetime
+import json
+import os
 import uuid
 from typing import Optional
 
@@ -7,16 +9,28 @@ from fastapi import (
     APIRouter,
     Depends,
     HTTPException,
+    Query,
     Request,
     status as http_status,
 )
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select, tuple_
 from sqlalchemy.orm import Session
 
 from realtime_ai_character.audio.text_to_speech import get_text_to_speech
-from realtime_ai_character.database.connection import get_db
+from realtime_ai_character.audio.text_to_speech.cache import tts_cache_stats
+from realtime_ai_character.database.connection import (
+    get_db,
+    pool_status,
+    run_in_session,
+    SessionLocal,
+)
+from realtime_ai_character.database.retrieval import retrieval_cache_stats
+from realtime_ai_character.database.write_behind import get_write_behind_queue
 from realtime_ai_character.llm.highlight_action_generator import (
     generate_highlight_action,
     generate_highlight_based_on_prompt,
+    stream_highlight,
 )
 from realtime_ai_character.models.interaction import Interaction
 from realtime_ai_character.models.feedback import Feedback, FeedbackRequest
@@ -32,9 +46,35 @@ from realtime_ai_character.character_catalog.catalog_manager import get_catalog_
 
 router = APIRouter()
 
+# rows fetched per round trip when streaming /session_history
+SESSION_HISTORY_STREAM_BATCH = int(os.getenv("SESSION_HISTORY_STREAM_BATCH", "500"))
+
+# the columns /session_history returns; deprecated columns and llm_config are left out
+SESSION_HISTORY_COLUMNS = (
+    Interaction.id,
+    Interaction.user_id,
+    Interaction.session_id,
+    Interaction.client_message_unicode,
+    Interaction.server_message_unicode,
+    Interaction.timestamp,
+    Interaction.platform,
+    Interaction.action_type,
+    Interaction.character_id,
+    Interaction.tools,
+    Interaction.language,
+    Interaction.message_id,
+)
+
 @router.get("/status")
 async def status():
-    return {"status": "ok", "message": "RealChar is running smoothly!"}
+    return {
+        "status": "ok",
+        "message": "RealChar is running smoothly!",
+        "db_pool": pool_status(),
+        "db_write_queue": get_write_behind_queue().stats(),
+        "retrieval_cache": retrieval_cache_stats(),
+        "tts_cache": tts_cache_stats(),
+    }
 
 @router.get("/characters")
 async def characters(db: Session = Depends(get_db)):
@@ -62,25 +102,66 @@ async def configs():
         "llms": ["gpt-4o"],
     }
 
+def _session_history_item(row) -> dict:
+    item = row._asdict()
+    if item["timestamp"] is not None:
+        item["timestamp"] = item["timestamp"].isoformat()
+    return item
+
+
+def _stream_session_history(stmt):
+    # runs in a worker thread; rows are fetched from a server-side cursor in batches,
+    # so memory does not grow with the length of the session
+    with SessionLocal() as db:
+        result = db.execute(stmt.execution_options(yield_per=SESSION_HISTORY_STREAM_BATCH))
+        for row in result:
+            yield json.dumps(_session_history_item(row)) + "\n"
+
+
 @router.get("/session_history")
-async def get_session_history(session_id: str, db: Session = Depends(get_db)):
-    # Read session history from the database.
-    interactions = await asyncio.to_thread(
-        db.query(Interaction).filter(Interaction.session_id == session_id).all
+async def get_session_history(
+    session_id: str,
+    after_timestamp: Optional[datetime.datetime] = None,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    stream: bool = False,
+):
+    """Interactions of a session ordered by (timestamp, id).
+
+    Returns every interaction as a JSON list, or with `limit` a page of at most that many.
+    The next page starts after the `timestamp` and `id` of the last interaction of a
+    page, passed as `after_timestamp` and `after_id`; a page shorter than `limit` is the
+    last one. With `stream` the interactions are streamed as NDJSON, one per line, with
+    constant memory however long the session is.
+    """
+    if (after_timestamp is None) != (after_id is None):
+        raise HTTPException(
+            status_code=http_status.HTTP_400_BAD_REQUEST,
+            detail="after_timestamp and after_id must be given together",
+        )
+    stmt = (
+        select(*SESSION_HISTORY_COLUMNS)
+        .where(Interaction.session_id == session_id)
+        .order_by(Interaction.timestamp, Interaction.id)
     )
-    # return interactions in json format
-    interactions_json = [interaction.to_dict() for interaction in interactions]
-    return interactions_json
+    if after_id is not None:
+        stmt = stmt.where(
+            tuple_(Interaction.timestamp, Interaction.id) > tuple_(after_timestamp, after_id)
+        )
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    if stream:
+        return StreamingResponse(_stream_session_history(stmt), media_type="application/x-ndjson")
+
+    rows = await run_in_session(lambda db: db.execute(stmt).all())
+    return [_session_history_item(row) for row in rows]
 
 @router.post("/feedback")
-async def post_feedback(
-    feedback_request: FeedbackRequest, db: Session = Depends(get_db)
-):
+async def post_feedback(feedback_request: FeedbackRequest):
     feedback = Feedback(**feedback_request.dict())
     feedback.user_id = "user_id"  # Replace with actual user ID when authentication is implemented
     feedback.created_at = datetime.datetime.now()
-    db.add(feedback)
-    await asyncio.to_thread(db.commit)
+    get_write_behind_queue().put(feedback)
 
 @router.post("/create_character")
 async def create_character(
@@ -294,6 +375,8 @@ async def generate_highlight(
 ):
     context = generate_highlight_request.context
     prompt = generate_highlight_request.prompt
+    if generate_highlight_request.stream:
+        return StreamingResponse(stream_highlight(context, prompt), media_type="text/plain")
     result = ""
     if prompt:
         result = await generate_highlight_based_on_prompt(context, prompt)
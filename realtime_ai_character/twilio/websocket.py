@@ -7,8 +7,8 @@ import os
 import random
 import uuid
 from enum import Enum
-from functools import reduce
-from typing import Callable, Coroutine
+from functools import partial, reduce
+from typing import Callable, Coroutine, Optional
 
 import numpy as np
 from fastapi import (
@@ -26,17 +26,27 @@ from twilio.twiml.voice_response import Connect, VoiceResponse
 
 from realtime_ai_character.audio.speech_to_text import get_speech_to_text
 from realtime_ai_character.audio.text_to_speech import get_text_to_speech
+from realtime_ai_character.audio.text_to_speech.pacing import (
+    get_paced_websocket,
+    get_playout_clock,
+)
 from realtime_ai_character.character_catalog.catalog_manager import get_catalog_manager
 from realtime_ai_character.llm import get_llm, LLM
 from realtime_ai_character.llm.base import (
     AsyncCallbackAudioHandler,
     AsyncCallbackTextHandler,
 )
+from realtime_ai_character.llm.prompt_budget import PromptBudget
+from realtime_ai_character.llm.speculation import (
+    Speculation,
+    SpeculationGate,
+    SPECULATIVE_GENERATION,
+    SPECULATIVE_RETRIEVAL,
+)
 from realtime_ai_character.logger import get_logger
 from realtime_ai_character.twilio.twilio_outgoing_call import MakeTwilioOutgoingCallRequest
 from realtime_ai_character.twilio.utils import is_valid_e164
 from realtime_ai_character.utils import (
-    build_history,
     ConversationHistory,
     get_connection_manager,
     task_done_callback,
@@ -152,6 +162,7 @@ class TwilioConversationEngine:
         self._most_recent_silence_frame = 0
         self._min_silence_ms = 1000  # silence time for user speech to be considered completed
         self._transcribe_tasks = []
+        self._partial_callback: Optional[Callable[[str, str], None]] = None
 
     def setTalkingThreshold(self, talking_threshold: float):
         self._talking_threshold = talking_threshold
@@ -162,10 +173,16 @@ class TwilioConversationEngine:
     def register_callback(self, callback: Callable[[str, str], Coroutine]):
         self._callback = callback
 
+    def register_partial_callback(self, callback: Callable[[str, str], None]):
+        """Called with the transcript so far each time a pause in the speech is transcribed."""
+        self._partial_callback = callback
+
     def _transcribe_callback(self, task: asyncio.Task):
         script = task.result()
         self._transcript_buffer.append(script)
         logger.info(f"Transcripting: {self._transcript_buffer}")
+        if self._partial_callback is not None:
+            self._partial_callback(" ".join(self._transcript_buffer), self._sid)
 
     async def add_bytes(self, chunk: bytes):
         import torch
@@ -289,6 +306,7 @@ async def handle_receive(
     speech_to_text = get_speech_to_text()
     buffer = TwilioConversationEngine(websocket, speech_to_text)
     conversation_history = ConversationHistory()
+    prompt_budget = PromptBudget(llm)
     random_character = random.choice(character_list)
     character = catalog_manager.get_character(random_character)
     if not character:
@@ -302,34 +320,75 @@ async def handle_receive(
     async def on_new_token(token):
         pass
 
-    async def tts_task_done_call_back(response):
-        conversation_history.ai.append(response)
-        token_buffer.clear()
-
-    async def llm_callback(transcript: str, sid: str):
-        if not transcript.strip() or not character:
-            return
-        conversation_history.user.append(transcript)
+    # retrieval (and reply) started from the transcript of the pauses so far
+    speculation: Optional[Speculation] = None
+
+    async def twilio_reply(
+        transcript: str,
+        sid: str,
+        context_task: Optional[asyncio.Task] = None,
+        gate: Optional[SpeculationGate] = None,
+    ):
+        async def tts_task_done_call_back(response):
+            conversation_history.ai.append(response)
+            token_buffer.clear()
+
+        callback = AsyncCallbackTextHandler(on_new_token, token_buffer, tts_task_done_call_back)
+        audio_callback = AsyncCallbackAudioHandler(
+            text_to_speech,
+            websocket,
+            tts_event,
+            character.voice_id,
+            language,
+            sid=sid,
+            platform="twilio",
+            segmentation_policy=(character.data or {}).get("tts_segmentation"),
+        )
+        if gate is not None:
+            # speculative reply: nothing is played until it is committed
+            callback = gate.wrap(callback)
+            audio_callback = gate.wrap(audio_callback)
         # temporary hack to get a random user id
         user_id = str(uuid.uuid4().hex)[:16]
-        await llm.achat(
-            history=build_history(conversation_history),
+        return await llm.achat(
+            history=prompt_budget.build_history(conversation_history),
             user_input=transcript,
             user_id=user_id,
             character=character,
-            callback=AsyncCallbackTextHandler(on_new_token, token_buffer, tts_task_done_call_back),
-            audioCallback=AsyncCallbackAudioHandler(
-                text_to_speech,
-                websocket,
-                tts_event,
-                character.voice_id,
-                language,
-                sid=sid,
-                platform="twilio",
-            ),
+            callback=callback,
+            audioCallback=audio_callback,
+            context=await context_task if context_task is not None else None,
         )
 
+    def on_partial_transcript(transcript: str, sid: str):
+        nonlocal speculation
+        if not transcript.strip() or not character:
+            return
+        if speculation is not None:
+            speculation.cancel()
+        speculation = Speculation(transcript, character)
+        if SPECULATIVE_GENERATION:
+            speculation.start_reply(partial(twilio_reply, transcript, sid))
+
+    async def llm_callback(transcript: str, sid: str):
+        nonlocal speculation
+        reply_task = None
+        context_task = None
+        if speculation is not None:
+            reply_task = speculation.commit_reply(transcript)
+            if reply_task is None:
+                context_task = speculation.context_for(transcript)
+            speculation = None
+        if not transcript.strip() or not character:
+            return
+        conversation_history.user.append(transcript)
+        if reply_task is None:
+            reply_task = asyncio.create_task(twilio_reply(transcript, sid, context_task))
+        await reply_task
+
     buffer.register_callback(llm_callback)
+    if SPECULATIVE_RETRIEVAL or SPECULATIVE_GENERATION:
+        buffer.register_partial_callback(on_partial_transcript)
     while True:
         try:
             # expect twilio to send connect event
@@ -373,7 +432,7 @@ async def handle_receive(
                 greeting_text = GREETING_TXT_MAP[language]
                 await text_to_speech.stream(
                     text=greeting_text,
-                    websocket=websocket,
+                    websocket=get_paced_websocket(websocket),
                     tts_event=tts_event,
                     voice_id=character.voice_id,
                     first_sentence=True,
@@ -401,6 +460,9 @@ async def handle_receive(
                 break
 
         except WebSocketDisconnect:
+            if speculation is not None:
+                speculation.cancel()
+            prompt_budget.close()
             await manager.disconnect(websocket)
             break
 
@@ -411,3 +473,5 @@ async def stop_twilio_voice(websocket, sid):
         "streamSid": sid,
     }
     await websocket.send_json(data)
+    # twilio discards the audio it has buffered on "clear"
+    get_playout_clock(websocket).reset()
@@ -1,4 +1,5 @@
 import asyncio
+import os
 from dataclasses import field
 from time import perf_counter
 from typing import Callable, Optional, TypedDict
@@ -14,6 +15,11 @@ from realtime_ai_character.logger import get_logger
 
 logger = get_logger(__name__)
 
+# streamed tokens are sent to the client in batches, at most this many milliseconds late
+TOKEN_FLUSH_INTERVAL_MS = float(os.getenv("TOKEN_FLUSH_INTERVAL_MS", "40"))
+# or as soon as this many characters are pending
+TOKEN_FLUSH_CHARS = int(os.getenv("TOKEN_FLUSH_CHARS", "64"))
+
 
 @dataclass
 class Character:
@@ -147,10 +153,84 @@ def get_connection_manager():
     return ConnectionManager.get_instance()
 
 
+class TokenCoalescer:
+    """Sends the tokens streamed to one websocket in batches instead of a frame per token.
+
+    Tokens are flushed TOKEN_FLUSH_INTERVAL_MS after the first pending one, or once
+    TOKEN_FLUSH_CHARS are pending. Every other message of the conversation, such as
+    transcripts or the end of a reply, has to go through `send_message` or `end_reply`
+    so that it goes out after all tokens queued before it.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        flush_interval: float = TOKEN_FLUSH_INTERVAL_MS / 1000,
+        flush_chars: int = TOKEN_FLUSH_CHARS,
+    ):
+        self.websocket = websocket
+        self.flush_interval = flush_interval
+        self.flush_chars = flush_chars
+        self.manager = get_connection_manager()
+        self.buffer: list[str] = []
+        self.buffered_chars = 0
+        self.frames = 0
+        self._flush_task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def send_token(self, token: str):
+        self.buffer.append(token)
+        self.buffered_chars += len(token)
+        if self.buffered_chars >= self.flush_chars:
+            await self.flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            await self._send_buffer()
+
+    async def send_message(self, message: str):
+        """Send a message after the pending tokens."""
+        async with self._lock:
+            await self._send_buffer()
+            await self.manager.send_message(message=message, websocket=self.websocket)
+
+    async def end_reply(self, message: str):
+        """Send the end-of-reply message after the pending tokens."""
+        await self.send_message(message)
+        if self.frames:
+            get_timer().record("Token Frames Per Reply", self.frames, unit=" frames")
+            self.frames = 0
+
+    async def _send_buffer(self):
+        if self._flush_task is not None and self._flush_task is not asyncio.current_task():
+            self._flush_task.cancel()
+            self._flush_task = None
+        if not self.buffer:
+            return
+        message = "".join(self.buffer)
+        self.buffer.clear()
+        self.buffered_chars = 0
+        self.frames += 1
+        await self.manager.send_message(message=message, websocket=self.websocket)
+
+    def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+
+
 class Timer(Singleton):
     def __init__(self):
         self.start_time: dict[str, float] = {}
         self.elapsed_time = {}
+        self.units: dict[str, str] = {}
 
     def start(self, id: str):
         self.start_time[id] = perf_counter()
@@ -159,23 +239,36 @@ class Timer(Singleton):
         if id in self.start_time:
             elapsed_time = perf_counter() - self.start_time[id]
             del self.start_time[id]
-            if id in self.elapsed_time:
-                self.elapsed_time[id].append(elapsed_time)
-            else:
-                self.elapsed_time[id] = [elapsed_time]
+            self.record(id, elapsed_time)
             if callback:
                 callback()
 
+    def record(self, id: str, elapsed_time: float, unit: str = "s"):
+        """Record a latency measured by the caller, e.g. for concurrent requests.
+
+        Other per-request metrics, such as sizes, can be recorded with their own unit.
+        """
+        if unit != "s":
+            self.units[id] = unit
+        if id in self.elapsed_time:
+            self.elapsed_time[id].append(elapsed_time)
+        else:
+            self.elapsed_time[id] = [elapsed_time]
+
     def report(self):
         for id, t in self.elapsed_time.items():
+            unit = self.units.get(id, "s")
+            precision = 3 if unit == "s" else 1
             logger.info(
-                f"{id:<30s}: {sum(t)/len(t):.3f}s [{min(t):.3f}s - {max(t):.3f}s] "
+                f"{id:<30s}: {sum(t)/len(t):.{precision}f}{unit} "
+                f"[{min(t):.{precision}f}{unit} - {max(t):.{precision}f}{unit}] "
                 f"({len(t)} samples)"
             )
 
     def reset(self):
         self.start_time = {}
         self.elapsed_time = {}
+        self.units = {}
 
 
 def get_timer() -> Timer:
@@ -3,29 +3,42 @@ import os
 import uuid
 import time
 from dataclasses import dataclass
+from functools import partial
+from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Path, Query, WebSocket, WebSocketDisconnect
 from firebase_admin import auth
 from firebase_admin.exceptions import FirebaseError
-from sqlalchemy.orm import Session
 
 from realtime_ai_character.audio.speech_to_text import get_speech_to_text, SpeechToText
 from realtime_ai_character.audio.text_to_speech import get_text_to_speech, TextToSpeech
+from realtime_ai_character.audio.text_to_speech.pacing import (
+    get_paced_websocket,
+    get_playout_clock,
+)
 from realtime_ai_character.character_catalog.catalog_manager import (
     CatalogManager,
     get_catalog_manager,
 )
-from realtime_ai_character.database.connection import get_db
+from realtime_ai_character.database.connection import run_in_session
+from realtime_ai_character.database.write_behind import get_write_behind_queue
 from realtime_ai_character.llm import get_llm, LLM
 from realtime_ai_character.llm.base import AsyncCallbackAudioHandler, AsyncCallbackTextHandler
+from realtime_ai_character.llm.prompt_budget import PromptBudget
+from realtime_ai_character.llm.speculation import (
+    Speculation,
+    SpeculationGate,
+    SPECULATIVE_GENERATION,
+    SPECULATIVE_RETRIEVAL,
+)
 from realtime_ai_character.logger import get_logger
 from realtime_ai_character.models.interaction import Interaction
 from realtime_ai_character.utils import (
-    build_history,
     ConversationHistory,
     get_connection_manager,
     get_timer,
     task_done_callback,
+    TokenCoalescer,
     Transcript,
 )
 
@@ -70,7 +83,7 @@ class SessionAuthResult:
     is_authenticated_user: bool
 
 
-async def check_session_auth(session_id: str, user_id: str, db: Session) -> SessionAuthResult:
+async def check_session_auth(session_id: str, user_id: str) -> SessionAuthResult:
     """
     Helper function to check if the session is authenticated.
     """
@@ -80,8 +93,8 @@ async def check_session_auth(session_id: str, user_id: str, db: Session) -> Sess
             is_authenticated_user=True,
         )
     try:
-        original_chat = await asyncio.to_thread(
-            db.query(Interaction).filter(Interaction.session_id == session_id).first
+        original_chat = await run_in_session(
+            lambda db: db.query(Interaction).filter(Interaction.session_id == session_id).first()
         )
     except Exception as e:
         logger.info(f"Failed to lookup session {session_id} with error {e}")
@@ -112,7 +125,6 @@ async def websocket_endpoint(
     character_id: str = Query(None),
     platform: str = Query(None),
     journal_mode: bool = Query(False),
-    db: Session = Depends(get_db),
     catalog_manager=Depends(get_catalog_manager),
     speech_to_text=Depends(get_speech_to_text),
     default_text_to_speech=Depends(get_text_to_speech),
@@ -129,7 +141,7 @@ async def websocket_endpoint(
             except HTTPException:
                 await websocket.close(code=1008, reason="Unauthorized")
                 return
-    session_auth_result = await check_session_auth(session_id=session_id, user_id=user_id, db=db)
+    session_auth_result = await check_session_auth(session_id=session_id, user_id=user_id)
     if not session_auth_result.is_authenticated_user:
         logger.info(f"User #{user_id} is not authorized to access session {session_id}")
         await websocket.close(code=1008, reason="Unauthorized")
@@ -144,7 +156,6 @@ async def websocket_endpoint(
                 websocket,
                 session_id,
                 user_id,
-                db,
                 llm,
                 catalog_manager,
                 character_id,
@@ -167,7 +178,6 @@ async def handle_receive(
     websocket: WebSocket,
     session_id: str,
     user_id: str,
-    db: Session,
     llm: LLM,
     catalog_manager: CatalogManager,
     character_id: str,
@@ -178,11 +188,17 @@ async def handle_receive(
     language: str,
     load_from_existing_session: bool = False,
 ):
+    # retrieval (and reply) started from the interim transcript of the current speech
+    speculation: Optional[Speculation] = None
+    prompt_budget = PromptBudget(llm)
+    token_stream = TokenCoalescer(websocket)
     try:
         conversation_history = ConversationHistory()
         if load_from_existing_session:
             logger.info(f"User #{user_id} is loading from existing session {session_id}")
-            await asyncio.to_thread(conversation_history.load_from_db, session_id=session_id, db=db)
+            await run_in_session(
+                lambda db: conversation_history.load_from_db(session_id=session_id, db=db)
+            )
 
         # 0. Receive client platform info (web, mobile, terminal)
         if not platform:
@@ -249,7 +265,7 @@ async def handle_receive(
         tts_task = asyncio.create_task(
             text_to_speech.stream(
                 text=greeting_text,
-                websocket=websocket,
+                websocket=get_paced_websocket(websocket),
                 tts_event=tts_event,
                 voice_id=character.voice_id,
                 first_sentence=True,
@@ -262,12 +278,14 @@ async def handle_receive(
         await manager.send_message(message="[end]\n", websocket=websocket)
 
         async def on_new_token(token):
-            return await manager.send_message(message=token, websocket=websocket)
+            return await token_stream.send_token(token)
 
         async def stop_audio():
             if tts_task and not tts_task.done():
                 tts_event.set()
                 tts_task.cancel()
+                # the client shows the tokens of the interrupted reply up to here
+                await token_stream.flush()
                 if previous_transcript:
                     conversation_history.user.append(previous_transcript)
                     conversation_history.ai.append(" ".join(token_buffer))
@@ -277,6 +295,76 @@ async def handle_receive(
                 except asyncio.CancelledError:
                     pass
                 tts_event.clear()
+                # the client drops buffered audio when the user starts talking
+                get_playout_clock(websocket).reset()
+
+        async def text_reply(
+            user_input: str,
+            context_task: Optional[asyncio.Task] = None,
+            gate: Optional[SpeculationGate] = None,
+        ):
+            message_id = str(uuid.uuid4().hex)[:16]
+
+            async def text_mode_tts_task_done_call_back(response):
+                # a speculative reply answered the interim transcript, but the turn is
+                # recorded with the final one
+                final_input = gate.transcript if gate is not None else user_input
+                # Send response to client, indicates the response is done
+                await token_stream.end_reply(f"[end={message_id}]\n")
+                # Update conversation history
+                conversation_history.user.append(final_input)
+                conversation_history.ai.append(response)
+                token_buffer.clear()
+                # Persist interaction in the database
+                tools = []
+                interaction = Interaction(
+                    user_id=user_id,
+                    session_id=session_id,
+                    client_message_unicode=final_input,
+                    server_message_unicode=response,
+                    platform=platform,
+                    action_type="text",
+                    character_id=character_id,
+                    tools=",".join(tools),
+                    language=language,
+                    message_id=message_id,
+                    llm_config=llm.get_config(),
+                )
+                get_write_behind_queue().put(interaction)
+
+            callback = AsyncCallbackTextHandler(
+                on_new_token, token_buffer, text_mode_tts_task_done_call_back
+            )
+            audio_callback = (
+                AsyncCallbackAudioHandler(
+                    text_to_speech,
+                    websocket,
+                    tts_event,
+                    character.voice_id,
+                    language,
+                    segmentation_policy=(character.data or {}).get("tts_segmentation"),
+                )
+                if not journal_mode
+                else None
+            )
+            if gate is not None:
+                # speculative reply: nothing reaches the client until it is committed
+                callback = gate.wrap(callback)
+                audio_callback = gate.wrap(audio_callback) if audio_callback else None
+            return await llm.achat(
+                history=prompt_budget.build_history(conversation_history),
+                user_input=user_input,
+                user_id=user_id,
+                character=character,
+                callback=callback,
+                audioCallback=audio_callback,
+                metadata={
+                    "message_id": message_id,
+                    "user_id": user_id,
+                    "session_id": session_id,
+                },
+                context=await context_task if context_task is not None else None,
+            )
 
         speech_recognition_interim = False
         current_speech = ""
@@ -323,66 +411,30 @@ async def handle_receive(
                 # 2. If client finished speech, use the sentence as input.
                 if msg_data.startswith("[SpeechFinished]"):
                     msg_data = current_speech
-                    logger.info(f"Full transcript: {current_speech}")
+                    logger.info(f"Full transcript: {msg_data}")
                     # Stop recognizing next audio as interim.
                     speech_recognition_interim = False
                     # Filter noises
-                    if not current_speech:
+                    if not msg_data:
                         continue
 
-                    await manager.send_message(
-                        message=f"[+]You said: {current_speech}", websocket=websocket
-                    )
+                    await token_stream.send_message(f"[+]You said: {msg_data}")
                     current_speech = ""
 
-                # 3. Send message to LLM
-                message_id = str(uuid.uuid4().hex)[:16]
-
-                async def text_mode_tts_task_done_call_back(response):
-                    # Send response to client, indicates the response is done
-                    await manager.send_message(message=f"[end={message_id}]\n", websocket=websocket)
-                    # Update conversation history
-                    conversation_history.user.append(msg_data)
-                    conversation_history.ai.append(response)
-                    token_buffer.clear()
-                    # Persist interaction in the database
-                    tools = []
-                    interaction = Interaction(
-                        user_id=user_id,
-                        session_id=session_id,
-                        client_message_unicode=msg_data,
-                        server_message_unicode=response,
-                        platform=platform,
-                        action_type="text",
-                        character_id=character_id,
-                        tools=",".join(tools),
-                        language=language,
-                        message_id=message_id,
-                        llm_config=llm.get_config(),
-                    )
-                    await asyncio.to_thread(interaction.save, db)
-
-                tts_task = asyncio.create_task(
-                    llm.achat(
-                        history=build_history(conversation_history),
-                        user_input=msg_data,
-                        user_id=user_id,
-                        character=character,
-                        callback=AsyncCallbackTextHandler(
-                            on_new_token, token_buffer, text_mode_tts_task_done_call_back
-                        ),
-                        audioCallback=AsyncCallbackAudioHandler(
-                            text_to_speech, websocket, tts_event, character.voice_id, language
-                        )
-                        if not journal_mode
-                        else None,
-                        metadata={"message_id": message_id, "user_id": user_id},
-                    )
-                )
+                # 3. Send message to LLM, or commit the reply speculated from the
+                # interim transcript
+                reply_task = None
+                context_task = None
+                if speculation is not None:
+                    reply_task = speculation.commit_reply(msg_data)
+                    if reply_task is None:
+                        context_task = speculation.context_for(msg_data)
+                    speculation = None
+                if reply_task is None:
+                    reply_task = asyncio.create_task(text_reply(msg_data, context_task))
+                tts_task = reply_task
                 tts_task.add_done_callback(task_done_callback)
 
-                # 5. Persist interaction in the database
-
             # handle binary message(audio)
             elif "bytes" in data:
                 binary_data = data["bytes"]
@@ -412,13 +464,12 @@ async def handle_receive(
                             for slice in transcript.slices:
                                 timestamp = transcript.timestamp + slice.start
                                 duration = slice.end - slice.start
-                                await manager.send_message(
-                                    message=f"[+transcript]?id={slice.id}"
+                                await token_stream.send_message(
+                                    f"[+transcript]?id={slice.id}"
                                     f"&speakerId={slice.speaker_id}"
                                     f"&text={slice.text}"
                                     f"&timestamp={timestamp}"
-                                    f"&duration={duration}",
-                                    websocket=websocket,
+                                    f"&duration={duration}"
                                 )
                                 logger.info(
                                     f"Message sent to client: transcript_id = {slice.id}, "
@@ -461,11 +512,16 @@ async def handle_receive(
                     # Filter noises.
                     if not interim_transcript:
                         continue
-                    await manager.send_message(
-                        message=f"[+&]{interim_transcript}", websocket=websocket
-                    )
+                    await token_stream.send_message(f"[+&]{interim_transcript}")
                     logger.info(f"Speech interim: {interim_transcript}")
                     current_speech = current_speech + " " + interim_transcript
+                    # get a head start on the reply while the user is still talking
+                    if SPECULATIVE_RETRIEVAL or SPECULATIVE_GENERATION:
+                        if speculation is not None:
+                            speculation.cancel()
+                        speculation = Speculation(current_speech, character)
+                        if SPECULATIVE_GENERATION and not journal_mode:
+                            speculation.start_reply(partial(text_reply, current_speech))
                     continue
 
                 # 1. Transcribe audio
@@ -487,9 +543,7 @@ async def handle_receive(
                 timer.start("LLM First Token")
 
                 # 2. Send transcript to client
-                await manager.send_message(
-                    message=f"[+]You said: {transcript}", websocket=websocket
-                )
+                await token_stream.send_message(f"[+]You said: {transcript}")
 
                 # 3. stop the previous audio stream, if new transcript is received
                 await stop_audio()
@@ -500,7 +554,7 @@ async def handle_receive(
 
                 async def audio_mode_tts_task_done_call_back(response):
                     # Send response to client, [=] indicates the response is done
-                    await manager.send_message(message="[=]", websocket=websocket)
+                    await token_stream.end_reply("[=]")
                     # Update conversation history
                     conversation_history.user.append(transcript)
                     conversation_history.ai.append(response)
@@ -520,12 +574,12 @@ async def handle_receive(
                         message_id=message_id,
                         llm_config=llm.get_config(),
                     )
-                    await asyncio.to_thread(interaction.save, db)
+                    get_write_behind_queue().put(interaction)
 
                 # 5. Send message to LLM
                 tts_task = asyncio.create_task(
                     llm.achat(
-                        history=build_history(conversation_history),
+                        history=prompt_budget.build_history(conversation_history),
                         user_input=transcript,
                         user_id=user_id,
                         character=character,
@@ -533,17 +587,30 @@ async def handle_receive(
                             on_new_token, token_buffer, audio_mode_tts_task_done_call_back
                         ),
                         audioCallback=AsyncCallbackAudioHandler(
-                            text_to_speech, websocket, tts_event, character.voice_id, language
+                            text_to_speech,
+                            websocket,
+                            tts_event,
+                            character.voice_id,
+                            language,
+                            segmentation_policy=(character.data or {}).get("tts_segmentation"),
                         )
                         if not journal_mode
                         else None,
-                        metadata={"message_id": message_id, "user_id": user_id},
+                        metadata={
+                            "message_id": message_id,
+                            "user_id": user_id,
+                            "session_id": session_id,
+                        },
                     )
                 )
                 tts_task.add_done_callback(task_done_callback)
 
     except WebSocketDisconnect:
         logger.info(f"User #{user_id} closed the connection")
+        if speculation is not None:
+            speculation.cancel()
+        prompt_budget.close()
+        token_stream.close()
         timer.reset()
         await manager.disconnect(websocket)
         return
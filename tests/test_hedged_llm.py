@@ -0,0 +1,62 @@
+import asyncio
+
+from langchain.callbacks.base import AsyncCallbackHandler
+
+from realtime_ai_character.llm import hedged_llm
+from realtime_ai_character.llm.hedged_llm import HedgedLlm
+
+
+class RecordingHandler(AsyncCallbackHandler):
+    def __init__(self):
+        self.tokens = []
+        self.ended = False
+
+    async def on_llm_new_token(self, token: str, *args, **kwargs):
+        self.tokens.append(token)
+
+    async def on_llm_end(self, *args, **kwargs):
+        self.ended = True
+
+
+class OneTokenLlm:
+    """Sends a single token, then holds back the end of the reply until `finish` is set."""
+
+    def __init__(self):
+        self.finish = asyncio.Event()
+
+    def get_config(self):
+        return {}
+
+    async def achat(self, history, callback, audioCallback=None, **kwargs):
+        await callback.on_llm_new_token("Hi")
+        await self.finish.wait()
+        await callback.on_llm_end(None)
+        return "Hi"
+
+
+def test_winner_tokens_are_delivered_when_it_wins(monkeypatch):
+    monkeypatch.setattr(hedged_llm, "get_retrieval_service", lambda: None)
+
+    async def run():
+        primary = OneTokenLlm()
+        llm = HedgedLlm(primary, OneTokenLlm(), deadline=1)
+        handler = RecordingHandler()
+        reply = asyncio.create_task(
+            llm.achat(
+                history=[],
+                user_input="Hello",
+                user_id="user_id",
+                character=None,
+                callback=handler,
+                context="",
+            )
+        )
+        await asyncio.sleep(0.1)
+        # the only token arrived before the primary won, and no further token releases it
+        assert handler.tokens == ["Hi"]
+        assert not handler.ended
+        primary.finish.set()
+        assert await reply == "Hi"
+        assert handler.ended
+
+    asyncio.run(run())